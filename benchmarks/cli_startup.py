@@ -0,0 +1,51 @@
+"""
+Measure the startup time of the ``ttrss`` command line tool.
+
+Compares a bare interpreter, importing the CLI module (which must not pull in
+``requests``), importing the client module, and ``ttrss --help``. Run from the
+repository root::
+
+    python benchmarks/cli_startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+import time
+
+
+CASES = [
+    ('python -c pass', ['-c', 'pass']),
+    ('import ttrss.cli', ['-c', 'import ttrss.cli']),
+    ('import ttrss.client', ['-c', 'import ttrss.client']),
+    ('ttrss --help', ['-m', 'ttrss.cli', '--help']),
+]
+
+
+def timeit(argv, runs):
+    best = None
+    total = 0.0
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable] + argv,
+                              stdout=open(os.devnull, 'w'))
+        elapsed = time.time() - start
+        total += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+    return best, total / runs
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lazy = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, ttrss.cli; print("requests" in sys.modules)'])
+    print('requests imported by ttrss.cli: {0}'.format(lazy.decode().strip()))
+    print('{0:<24} {1:>10} {2:>10}'.format('case', 'best ms', 'mean ms'))
+    for name, argv in CASES:
+        best, mean = timeit(argv, runs)
+        print('{0:<24} {1:>10.1f} {2:>10.1f}'.format(
+            name, best * 1000, mean * 1000))
+
+
+if __name__ == '__main__':
+    main()
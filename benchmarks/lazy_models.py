@@ -0,0 +1,66 @@
+"""
+Measure building and filtering headlines with eager and lazy model objects.
+
+Builds a number of ``Headline`` objects (100000 by default) from decoded
+JSON, then collects the ids of the unread headlines of one feed, with
+``lazy_models`` off and on. Run from the repository root::
+
+    python benchmarks/lazy_models.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ttrss.client import TTRClient, Headline
+
+
+def make_data(count):
+    return [{
+        'id': str(i),
+        'unread': i % 3 == 0,
+        'marked': False,
+        'published': False,
+        'updated': 1400000000 + i,
+        'is_updated': False,
+        'title': 'Headline number {0}'.format(i),
+        'link': 'http://example.com/articles/{0}'.format(i),
+        'feed_id': i % 50,
+        'tags': [''],
+        'labels': [[-1025, 'Important', '', '']],
+        'attachments': [],
+        'feed_title': 'Feed {0}'.format(i % 50),
+        'comments_count': 0,
+        'comments_link': '',
+        'always_display_attachments': False,
+        'author': 'author',
+        'score': 0,
+        'note': None,
+        'lang': 'en',
+    } for i in range(count)]
+
+
+def measure(name, client, data):
+    start = time.time()
+    headlines = [Headline(d, client) for d in data]
+    built = time.time() - start
+    start = time.time()
+    ids = [h.id for h in headlines if h.unread and h.feed_id == 7]
+    filtered = time.time() - start
+    print('{0:<8} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4:>8}'.format(
+        name, built * 1000, filtered * 1000, (built + filtered) * 1000,
+        len(ids)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('{0:<8} {1:>10} {2:>10} {3:>10} {4:>8}'.format(
+        'mode', 'build ms', 'filter ms', 'total ms', 'matches'))
+    for name, lazy in (('eager', False), ('lazy', True)):
+        client = TTRClient('http://localhost', lazy_models=lazy)
+        # Fresh dicts, as lazy objects keep (and may modify) theirs.
+        measure(name, client, make_data(count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure serializing model objects for sending them to other processes.
+
+Compares pickle with ``ttrss.serialize`` for a number of headlines (100000 by
+default), reporting throughput and size. Run from the repository root::
+
+    python benchmarks/serialize_models.py [count]
+"""
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ttrss.client import Headline
+from ttrss import serialize
+
+
+def make_headlines(count):
+    return [Headline({
+        'id': i,
+        'unread': i % 3 == 0,
+        'marked': False,
+        'published': False,
+        'updated': 1400000000 + i,
+        'is_updated': False,
+        'title': 'Headline number {0}'.format(i),
+        'link': 'http://example.com/articles/{0}'.format(i),
+        'feed_id': str(i % 50),
+        'tags': [''],
+        'labels': [],
+        'feed_title': 'Feed {0}'.format(i % 50),
+        'comments_count': 0,
+        'comments_link': '',
+        'always_display_attachments': False,
+        'author': 'author',
+        'score': 0,
+        'note': None,
+        'lang': 'en',
+    }, client=object()) for i in range(count)]
+
+
+def measure(name, dumps, loads, objects):
+    start = time.time()
+    data = dumps(objects)
+    dumped = time.time() - start
+    start = time.time()
+    loads(data)
+    loaded = time.time() - start
+    print('{0:<20} {1:>10.0f} {2:>10.0f} {3:>10.1f}'.format(
+        name, len(objects) / dumped, len(objects) / loaded,
+        len(data) / 1024.0 / 1024.0))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objects = make_headlines(count)
+    print('{0:<20} {1:>10} {2:>10} {3:>10}'.format(
+        'format', 'dumps/s', 'loads/s', 'MiB'))
+    measure('pickle', lambda o: pickle.dumps(o, pickle.HIGHEST_PROTOCOL),
+            pickle.loads, objects)
+    formats = ['marshal']
+    if serialize.msgpack is not None:
+        formats.insert(0, 'msgpack')
+    for fmt in formats:
+        measure('serialize ' + fmt,
+                lambda o: serialize.dumps(o, format=fmt),
+                serialize.loads, objects)
+
+
+if __name__ == '__main__':
+    main()
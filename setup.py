@@ -15,6 +15,9 @@ setup(
         package_data={'': ['README.rst']},
         include_package_data=True,
         install_requires=['requests>=1.1.0'],
+        entry_points={
+            'console_scripts': ['ttrss = ttrss.cli:main'],
+            },
         provides=['ttrss'],
         classifiers=[
             'Development Status :: 4 - Beta',
@@ -0,0 +1,277 @@
+"""
+A tiny in-process stand-in for the Tiny Tiny RSS JSON API, used by the tests
+that don't need a real server.
+"""
+import json
+import threading
+import time
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeTTRSS(object):
+    """
+    Serve a small, mutable data set on a random local port.
+
+    ``requests`` is the list of decoded request bodies received, ``delay``
+    an optional number of seconds (or a dict of op -> seconds) to sleep
+    before answering, and ``max_limit`` the most headlines returned at once.
+    ``faults`` maps an op to a list of what happens to its next requests:
+    a number of seconds to stall, or ``500`` to fail with that status.
+    """
+    USER = 'admin'
+    PASSWORD = 'password'
+
+    def __init__(self, feeds=3, articles_per_feed=5):
+        self.requests = []
+        self.sessions = set()
+        self.logins = 0
+        self.delay = 0
+        self.faults = {}
+        self.version = '1.7.6'
+        self.api_level = 8
+        self.max_limit = 200
+        self.lock = threading.Lock()
+        self.feeds = {}
+        self.articles = {}
+        self.labels = {-1025: 'Important', -1026: 'Later'}
+        now = int(time.time())
+        aid = 1
+        for fid in range(1, feeds + 1):
+            self.feeds[fid] = {
+                'id': fid, 'title': 'Feed {0}'.format(fid),
+                'feed_url': 'http://example.com/{0}.xml'.format(fid),
+                'cat_id': 1 if fid % 2 else 2, 'last_updated': now,
+            }
+            for i in range(articles_per_feed):
+                self.articles[aid] = {
+                    'id': aid, 'feed_id': fid,
+                    'title': 'Article {0}'.format(aid),
+                    'link': 'http://example.com/a/{0}'.format(aid),
+                    'content': 'Content of article {0}'.format(aid),
+                    'updated': now - 3600 * (articles_per_feed - 1 - i),
+                    'unread': True,
+                    'marked': False, 'published': False, 'score': 0,
+                    'note': None, 'labels': [], 'attachments': [],
+                }
+                aid += 1
+
+        server = _Server(('127.0.0.1', 0), self._handler())
+        self.server = server
+        self.url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+        self.thread = threading.Thread(target=server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ops(self):
+        return [r.get('op') for r in self.requests]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length).decode('utf-8'))
+                with fake.lock:
+                    fake.requests.append(body)
+                    faults = fake.faults.get(body.get('op'))
+                    fault = faults.pop(0) if faults else None
+                if fault == 500:
+                    self.send_response(500)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                delay = fake.delay
+                if isinstance(delay, dict):
+                    delay = delay.get(body.get('op'), 0)
+                if delay or fault:
+                    time.sleep((delay or 0) + (fault or 0))
+                with fake.lock:
+                    status, content = fake.dispatch(body)
+                data = json.dumps({'seq': 0, 'status': status,
+                                   'content': content}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def dispatch(self, body):
+        op = body.get('op')
+        if op == 'login':
+            if (body.get('user') == self.USER and
+                    body.get('password') == self.PASSWORD):
+                self.logins += 1
+                sid = 'sid{0}'.format(self.logins)
+                self.sessions.add(sid)
+                return 0, {'session_id': sid, 'api_level': self.api_level}
+            return 1, {'error': 'LOGIN_ERROR'}
+        if op in ('getVersion', 'getApiLevel'):
+            pass
+        elif op == 'isLoggedIn':
+            return 0, {'status': body.get('sid') in self.sessions}
+        elif body.get('sid') not in self.sessions:
+            return 1, {'error': 'NOT_LOGGED_IN'}
+        handler = getattr(self, 'op_' + op, None)
+        if handler is None:
+            return 1, {'error': 'UNKNOWN_METHOD'}
+        return 0, handler(body)
+
+    def _ids(self, value):
+        return [int(i) for i in str(value).split(',') if i]
+
+    def _unread(self, fid=None):
+        return sum(1 for a in self.articles.values()
+                   if a['unread'] and (fid is None or a['feed_id'] == fid))
+
+    def _headline(self, a, body):
+        h = dict((k, v) for k, v in a.items() if k != 'content')
+        h['feed_title'] = self.feeds[a['feed_id']]['title']
+        if body.get('show_content'):
+            h['content'] = a['content']
+        if body.get('show_excerpt'):
+            h['excerpt'] = a['content'][:body.get('excerpt_length') or 100]
+        return h
+
+    def op_getVersion(self, body):
+        return {'version': self.version}
+
+    def op_getApiLevel(self, body):
+        return {'level': self.api_level}
+
+    def op_logout(self, body):
+        self.sessions.discard(body.get('sid'))
+        return {'status': 'OK'}
+
+    def op_getUnread(self, body):
+        return {'unread': str(self._unread())}
+
+    def op_getCounters(self, body):
+        counters = [{'id': 'global-unread', 'counter': self._unread()},
+                    {'id': 'subscribed-feeds', 'counter': len(self.feeds)}]
+        cats = {}
+        for fid, feed in self.feeds.items():
+            n = self._unread(fid)
+            counters.append({'id': fid, 'counter': n})
+            cats[feed['cat_id']] = cats.get(feed['cat_id'], 0) + n
+        for cid, n in cats.items():
+            counters.append({'id': cid, 'kind': 'cat', 'counter': n})
+        return counters
+
+    def op_getConfig(self, body):
+        return {'num_feeds': len(self.feeds), 'daemon_is_running': True}
+
+    def op_getCategories(self, body):
+        cats = {}
+        for fid, feed in self.feeds.items():
+            cats.setdefault(feed['cat_id'], 0)
+            cats[feed['cat_id']] += self._unread(fid)
+        return [{'id': str(cid), 'title': 'Category {0}'.format(cid),
+                 'unread': n} for cid, n in sorted(cats.items())]
+
+    def op_getFeeds(self, body):
+        cat_id = int(body.get('cat_id', -1))
+        feeds = []
+        for fid in sorted(self.feeds):
+            feed = dict(self.feeds[fid], unread=self._unread(fid))
+            if cat_id not in (-3, -4) and feed['cat_id'] != cat_id:
+                continue
+            if body.get('unread_only') and not feed['unread']:
+                continue
+            feeds.append(feed)
+        offset = int(body.get('offset') or 0)
+        limit = int(body.get('limit') or 0)
+        return feeds[offset:offset + limit] if limit else feeds[offset:]
+
+    def op_getFeedTree(self, body):
+        return {'categories': {'items': self.op_getCategories(body)}}
+
+    def op_getLabels(self, body):
+        return [{'id': lid, 'caption': caption, 'checked': False}
+                for lid, caption in sorted(self.labels.items())]
+
+    def op_getHeadlines(self, body):
+        feed_id = int(body.get('feed_id', -4))
+        items = sorted(self.articles.values(), key=lambda a: -a['id'])
+        if body.get('order_by') == 'date_reverse':
+            items.reverse()
+        if body.get('is_cat'):
+            items = [a for a in items
+                     if self.feeds[a['feed_id']]['cat_id'] == feed_id]
+        elif feed_id <= -1025:
+            items = [a for a in items
+                     if feed_id in [l[0] for l in a['labels']]]
+        elif feed_id > 0:
+            items = [a for a in items if a['feed_id'] == feed_id]
+        if body.get('view_mode') == 'unread':
+            items = [a for a in items if a['unread']]
+        if body.get('since_id'):
+            items = [a for a in items if a['id'] > int(body['since_id'])]
+        skip = int(body.get('skip') or 0)
+        limit = min(int(body.get('limit') or 0) or 60, self.max_limit)
+        return [self._headline(a, body) for a in items[skip:skip + limit]]
+
+    def op_getArticle(self, body):
+        return [dict(self.articles[i]) for i in self._ids(body['article_id'])
+                if i in self.articles]
+
+    def op_updateArticle(self, body):
+        field = {0: 'marked', 1: 'published', 2: 'unread',
+                 3: 'note', 4: 'score'}[int(body['field'])]
+        mode = int(body.get('mode', 0))
+        ids = [i for i in self._ids(body['article_ids']) if i in self.articles]
+        for i in ids:
+            a = self.articles[i]
+            if field == 'note':
+                a[field] = body.get('data')
+            elif field == 'score':
+                a[field] = int(body.get('data'))
+            elif mode == 2:
+                a[field] = not a[field]
+            else:
+                a[field] = bool(mode)
+        return {'status': 'OK', 'updated': len(ids)}
+
+    def op_catchupFeed(self, body):
+        feed_id = int(body['feed_id'])
+        for a in self.articles.values():
+            if body.get('is_cat'):
+                match = self.feeds[a['feed_id']]['cat_id'] == feed_id
+            else:
+                match = a['feed_id'] == feed_id
+            if match:
+                a['unread'] = False
+        return {'status': 'OK'}
+
+    def op_setArticleLabel(self, body):
+        label_id = int(body['label_id'])
+        assign = body.get('assign') in (True, 'true')
+        ids = [i for i in self._ids(body['article_ids']) if i in self.articles]
+        for i in ids:
+            labels = [l for l in self.articles[i]['labels']
+                      if l[0] != label_id]
+            if assign:
+                labels.append([label_id, self.labels[label_id], '', ''])
+            self.articles[i]['labels'] = labels
+        return {'status': 'OK', 'updated': len(ids)}
+
+    def op_shareToPublished(self, body):
+        return {'status': 'OK'}
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+sys.path.insert(0, './')
+from ttrss.attachments import AttachmentDownloader, attachment_urls
+from ttrss.client import Headline
+
+
+FILES = {
+    '/a.mp3': b'a' * 300000,
+    '/b.mp3': b'b' * 1000,
+    '/copy-of-a.mp3': b'a' * 300000,
+}
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('Range')))
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        status = 200
+        rng = self.headers.get('Range')
+        if rng:
+            start = int(rng.split('=')[1].rstrip('-'))
+            data = data[start:]
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAttachmentDownloader(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever).start()
+        Handler.requests = []
+        self.tmp = tempfile.mkdtemp()
+        self.downloader = AttachmentDownloader(self.tmp, chunk_size=4096)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def headline(self, *paths):
+        return Headline({'id': 1, 'attachments': [
+            {'content_url': self.url + p} for p in paths]}, None)
+
+    def test_urls(self):
+        h = self.headline('/a.mp3', '/b.mp3')
+        self.assertEqual(attachment_urls([h, h, self.url + '/c.mp3']), [
+            self.url + '/a.mp3', self.url + '/b.mp3', self.url + '/c.mp3'])
+
+    def test_download_and_cache(self):
+        items = [self.headline('/a.mp3', '/b.mp3'),
+                 self.headline('/copy-of-a.mp3', '/missing.mp3')]
+        paths = self.downloader.download(items)
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(paths[self.url + '/a.mp3'],
+                         paths[self.url + '/copy-of-a.mp3'])
+        with open(paths[self.url + '/b.mp3'], 'rb') as f:
+            self.assertEqual(f.read(), FILES['/b.mp3'])
+        self.assertIn(self.url + '/missing.mp3', self.downloader.errors)
+
+        Handler.requests = []
+        self.assertEqual(self.downloader.download(items[:1]),
+                         dict((k, paths[k]) for k in attachment_urls(items[:1])))
+        self.assertEqual(Handler.requests, [])
+
+    def test_resume(self):
+        url = self.url + '/a.mp3'
+        partial = os.path.join(self.tmp, 'partial', self.downloader._key(url))
+        with open(partial, 'wb') as f:
+            f.write(FILES['/a.mp3'][:1000])
+        path = self.downloader.download([url])[url]
+        self.assertEqual(Handler.requests, [('/a.mp3', 'bytes=1000-')])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), FILES['/a.mp3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
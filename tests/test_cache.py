@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss.cache import SharedCache
+from ttrss.client import TTRClient
+from ttrss.profiling import CallProfiler
+
+from tests.fakeserver import FakeTTRSS
+
+
+def _count_labels(url, path, results):
+    client = TTRClient(url, FakeTTRSS.USER, FakeTTRSS.PASSWORD,
+                       cache=SharedCache(path))
+    client.login()
+    results.put(len(client.get_labels()))
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.db')
+        self.now = [1000.0]
+        self.server = FakeTTRSS()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp)
+
+    def client(self, **kwargs):
+        cache = SharedCache(self.path, clock=lambda: self.now[0], **kwargs)
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, cache=cache)
+        client.login()
+        return client
+
+    def count(self, op):
+        return self.server.ops().count(op)
+
+    def test_shared_between_clients(self):
+        a, b = self.client(), self.client()
+        a.get_feed_tree()
+        self.assertEqual(b.get_feed_tree(), a.get_feed_tree())
+        self.assertEqual(self.count('getFeedTree'), 1)
+        self.assertEqual(b.stats()['cache']['hits'], 1)
+        a.logged_in()
+        b.logged_in()
+        self.assertEqual(self.count('isLoggedIn'), 2)
+
+    def test_ttl(self):
+        a = self.client(ttl={'getLabels': 10, 'getCategories': 0})
+        a.get_labels()
+        a.get_categories()
+        self.now[0] += 5
+        a.get_labels()
+        a.get_categories()
+        self.assertEqual(self.count('getLabels'), 1)
+        self.assertEqual(self.count('getCategories'), 2)
+        self.now[0] += 6
+        a.get_labels()
+        self.assertEqual(self.count('getLabels'), 2)
+
+    def test_invalidation(self):
+        a, b = self.client(), self.client()
+        self.assertEqual(a.get_unread_count(), 15)
+        a.get_labels()
+        b.mark_read([1, 2])
+        self.assertEqual(a.get_unread_count(), 13)
+        a.get_labels()
+        self.assertEqual(self.count('getUnread'), 2)
+        self.assertEqual(self.count('getLabels'), 1)
+
+    def test_stale_put_dropped(self):
+        cache = SharedCache(self.path)
+        body = '{"op": "getUnread"}'
+        generation = cache.generation('scope')
+        # Another process marks articles read while the request is sent.
+        SharedCache(self.path).invalidate('scope', 'updateArticle')
+        cache.put('scope', body, 'getUnread', '{"stale": 1}', generation)
+        self.assertIsNone(cache.get('scope', body))
+        cache.put('scope', body, 'getUnread', '{"fresh": 1}',
+                  cache.generation('scope'))
+        self.assertEqual(cache.get('scope', body), '{"fresh": 1}')
+
+    def test_hits_profiled(self):
+        a = self.client()
+        a.get_labels()
+        profiler = CallProfiler(threshold=0)
+        profiler.instrument(a)
+        a.get_labels()
+        self.assertTrue(profiler.reports[0]['bytes'] > 0)
+        self.assertEqual(profiler.reports[0]['requests'], 0)
+
+    def test_across_processes(self):
+        results = multiprocessing.Queue()
+        for _ in range(3):
+            p = multiprocessing.Process(
+                target=_count_labels, args=(self.server.url, self.path,
+                                            results))
+            p.start()
+            p.join()
+            self.assertEqual(results.get(timeout=5), 2)
+        self.assertEqual(self.count('getLabels'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss import capabilities
+from ttrss.capabilities import Capabilities, parse_version
+from ttrss.client import TTRClient
+from ttrss.journal import WriteJournal
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestCapabilities(unittest.TestCase):
+    def test_parse_version(self):
+        self.assertEqual(parse_version('1.7.6'), (1, 7, 6))
+        self.assertEqual(parse_version('17.4 (a1b2c3)'), (17, 4))
+        self.assertEqual(parse_version('unknown'), ())
+
+    def test_supports(self):
+        old = Capabilities('1.5.4', 2)
+        self.assertFalse(old.supports('getCategories', 'include_empty'))
+        self.assertTrue(old.supports('getHeadlines', 'include_attachments'))
+        self.assertFalse(old.supports('getHeadlines', 'since_id'))
+        self.assertFalse(old.supports('getFeedTree'))
+        self.assertTrue(old.supports('getHeadlines', 'limit'))
+        new = Capabilities('21.03', 15)
+        self.assertTrue(new.supports('getHeadlines', 'excerpt_length'))
+        features = old.as_dict()['features']
+        self.assertEqual(features['getFeedTree'], {'getFeedTree': False})
+        self.assertFalse(features['getHeadlines']['order_by'])
+
+    def test_prune(self):
+        caps = Capabilities('1.7.6', 8)
+        pruned = caps.prune({'op': 'getHeadlines', 'feed_id': 1,
+                             'since_id': None, 'order_by': 'date_reverse',
+                             'excerpt_length': 100})
+        self.assertEqual(pruned, {'op': 'getHeadlines', 'feed_id': 1,
+                                  'order_by': 'date_reverse'})
+
+
+class TestClientCapabilities(unittest.TestCase):
+    def setUp(self):
+        capabilities.forget()
+        self.server = FakeTTRSS()
+        self.server.version = '1.6.1'
+        self.server.api_level = 3
+
+    def tearDown(self):
+        capabilities.forget()
+        self.server.close()
+
+    def client(self):
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, detect_capabilities=True)
+        client.login()
+        return client
+
+    def test_probe_once_and_prune(self):
+        a, b = self.client(), self.client()
+        a.get_headlines(feed_id=1, order_by='date_reverse')
+        b.get_categories(include_empty=True)
+        self.assertEqual(self.server.ops().count('getVersion'), 1)
+        self.assertEqual(self.server.ops().count('getApiLevel'), 1)
+        headlines = [r for r in self.server.requests
+                     if r['op'] == 'getHeadlines'][0]
+        self.assertNotIn('order_by', headlines)
+        self.assertNotIn('excerpt_length', headlines)
+        self.assertNotIn('since_id', headlines)
+        self.assertIn('include_nested', headlines)
+        categories = [r for r in self.server.requests
+                      if r['op'] == 'getCategories'][0]
+        self.assertNotIn('include_empty', categories)
+        self.assertEqual(a.capabilities().api_level, 3)
+        capabilities.forget(self.server.url)
+        self.server.api_level = 12
+        self.assertEqual(b.capabilities().api_level, 12)
+
+    def test_server_without_api_level(self):
+        self.server.version = '1.5.4'
+        self.server.op_getApiLevel = None
+        client = self.client()
+        self.assertEqual(client.capabilities().api_level, 0)
+        self.assertEqual(len(client.get_headlines(feed_id=1)), 5)
+        self.assertEqual(len(client.get_headlines(feed_id=2)), 5)
+        self.assertEqual(self.server.ops().count('getApiLevel'), 1)
+
+    def test_unreachable_server_with_journal(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, detect_capabilities=True,
+                           journal=WriteJournal(os.path.join(tmp, 'j')))
+        client.login()
+        client.url = 'http://127.0.0.1:9/api/'
+        client.mark_read([1, 2])
+        self.assertEqual(len(client.journal), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
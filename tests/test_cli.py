@@ -0,0 +1,103 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss import cli
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.tmp = tempfile.mkdtemp()
+        self.session_file = os.path.join(self.tmp, 'session.json')
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp)
+
+    def run_cli(self, argv, stdin=None, code=0):
+        argv = ['--url', self.server.url, '--user', FakeTTRSS.USER,
+                '--password', FakeTTRSS.PASSWORD,
+                '--session-file', self.session_file] + argv
+        out = io.StringIO()
+        stdout, sys.stdout = sys.stdout, out
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        if stdin is not None:
+            stdin, sys.stdin = sys.stdin, io.StringIO(stdin)
+        try:
+            self.assertEqual(cli.main(argv), code)
+        finally:
+            self.errors = sys.stderr.getvalue().splitlines()
+            sys.stdout = stdout
+            sys.stderr = stderr
+            if stdin is not None:
+                sys.stdin = stdin
+        return out.getvalue().splitlines()
+
+    def test_lazy_import(self):
+        out = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys; from ttrss import cli; cli.build_parser(); '
+            'print("requests" in sys.modules)'])
+        self.assertEqual(out.strip(), b'False')
+
+    def test_unread(self):
+        self.assertEqual(self.run_cli(['unread']), ['15'])
+        feeds = self.run_cli(['unread', '--feeds'])
+        self.assertEqual(len(feeds), 3)
+
+    def test_session_reused(self):
+        self.run_cli(['unread'])
+        self.run_cli(['unread'])
+        self.assertEqual(self.server.ops().count('login'), 1)
+
+    def test_expired_session(self):
+        self.run_cli(['unread'])
+        self.server.sessions.clear()
+        self.assertEqual(self.run_cli(['unread']), ['15'])
+        self.assertEqual(self.server.ops().count('login'), 2)
+
+    def test_mark_read_and_catchup(self):
+        out = self.run_cli(['mark-read', '--feed', '1', '--title', '[12]$'])
+        self.assertEqual(out, ['2'])
+        self.assertEqual(self.run_cli(['unread']), ['13'])
+        self.run_cli(['catchup', '2'])
+        self.assertEqual(self.run_cli(['unread']), ['8'])
+
+    def test_batch(self):
+        out = self.run_cli(['batch'], stdin=u'unread\n# comment\n'
+                           u'headlines --feed 1 --limit 2\n')
+        self.assertEqual(len(out), 3)
+        self.assertEqual(self.server.ops().count('login'), 1)
+
+    def test_batch_failures(self):
+        self.server.faults = {'getUnread': [500]}
+        out = self.run_cli(['batch'], stdin=u'unread\nno-such-command\n'
+                           u'headlines --title "["\n'
+                           u'headlines --feed 1 --limit 1\n', code=2)
+        self.assertEqual(len(out), 1)
+        self.assertEqual(self.errors[0], 'ttrss: line 1: HTTP 500')
+        self.assertTrue(self.errors[-2].startswith(
+            'ttrss: line 3: invalid --title pattern'))
+        self.assertEqual(self.errors[-1], 'ttrss: 3 of 4 commands failed')
+
+    def test_limit_after_filters(self):
+        out = self.run_cli(['headlines', '--feed', '1', '--title', '[12]$',
+                            '--limit', '1'])
+        self.assertEqual([l.split('\t')[0] for l in out], ['2'])
+
+    def test_export(self):
+        path = os.path.join(self.tmp, 'export.jsonl')
+        self.run_cli(['export', '--feed', '3', '--content', '-o', path])
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
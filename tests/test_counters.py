@@ -0,0 +1,56 @@
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestUnreadCounters(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+        self.now = [0]
+        self.counters = self.client.track_counters(reconcile_interval=60)
+        self.counters._clock = lambda: self.now[0]
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_seed_once(self):
+        self.assertEqual(self.client.get_unread_count(), 15)
+        self.assertEqual(self.counters.feed(1), 5)
+        self.assertEqual(self.counters.category(1), 10)
+        self.assertEqual(self.server.ops().count('getCounters'), 1)
+
+    def test_optimistic_updates(self):
+        self.counters.total()
+        ids = [h.id for h in self.client.get_headlines(feed_id=1)]
+        self.client.mark_read(ids[:2])
+        self.client.toggle_unread(ids[0])
+        self.client.mark_unread(ids[1])
+        self.client.mark_read(ids[2])
+        self.assertEqual(self.counters.feed(1), 4)
+        self.assertEqual(self.counters.category(1), 9)
+        self.client.catchup_feed(2)
+        self.assertEqual(self.counters.category(2), 0)
+        self.assertEqual(self.client.get_unread_count(), 9)
+        self.assertEqual(self.server.ops().count('getCounters'), 1)
+        self.assertEqual(self.counters.drift, 0)
+
+    def test_reconcile(self):
+        self.counters.total()
+        self.server.articles[1]['unread'] = False
+        self.assertEqual(self.counters.total(), 15)
+        self.now[0] = 61
+        self.assertEqual(self.counters.total(), 14)
+        # Unknown articles count as drift.
+        self.client.mark_read(list(range(2, 30)))
+        self.assertEqual(self.counters.total(), 0)
+        self.assertEqual(self.server.ops().count('getCounters'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
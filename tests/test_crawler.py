@@ -0,0 +1,55 @@
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient, Article, Headline
+from ttrss.crawler import Crawler
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestCrawler(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_shards_balance_sizes(self):
+        crawler = Crawler(self.client, processes=2)
+        self.assertEqual(crawler.shards([1, 2, 3, 4]), [[1, 3], [2, 4]])
+
+    def test_crawl_all_feeds(self):
+        crawler = Crawler(self.client, processes=2, queue_size=1)
+        results = dict(crawler.crawl())
+        self.assertEqual(sorted(results), [1, 2, 3])
+        for feed_id, items in results.items():
+            self.assertEqual(len(items), 5)
+            for item in items:
+                self.assertIsInstance(item, Article)
+                self.assertEqual(int(item.feed_id), feed_id)
+                self.assertIs(item._client, self.client)
+        self.assertEqual(crawler.errors, {})
+        self.assertEqual([s['shard'] for s in crawler.summary], [0, 1])
+        self.assertEqual(sum(s['items'] for s in crawler.summary), 15)
+        self.assertEqual(sum(s['feeds'] for s in crawler.summary), 3)
+        # One login here and one per worker.
+        self.assertEqual(self.server.ops().count('login'), 3)
+
+    def test_work_stealing(self):
+        self.server.delay = {'getHeadlines': 0.2}
+        crawler = Crawler(self.client, processes=2, articles=False)
+        # Everything in the first shard; the second worker has to steal.
+        crawler.shards = lambda feeds: [[1, 2, 3, 1, 2, 3], []]
+        results = list(crawler.crawl())
+        self.assertEqual(len(results), 6)
+        self.assertIsInstance(results[0][1][0], Headline)
+        self.assertTrue(crawler.summary[1]['stolen'] > 0)
+        self.assertEqual(
+            sum(s['feeds'] for s in crawler.summary), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
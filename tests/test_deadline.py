@@ -0,0 +1,84 @@
+import sys
+import threading
+import time
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.deadline import deadline, remaining
+from ttrss.exceptions import TTRDeadlineExceeded
+from ttrss.scheduler import RequestScheduler
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS(feeds=1, articles_per_feed=20)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_nesting(self):
+        self.assertIsNone(remaining())
+        with deadline(10):
+            with deadline(60):
+                self.assertTrue(remaining() <= 10)
+            self.assertEqual(remaining(5), 5)
+
+    def test_stalled_request(self):
+        self.server.delay = {'getArticle': 2}
+        start = time.time()
+        with deadline(0.3):
+            self.assertRaises(TTRDeadlineExceeded,
+                              self.client.get_articles, 1)
+        self.assertTrue(time.time() - start < 1.5)
+
+    def test_expired_before_sending(self):
+        with deadline(0):
+            self.assertRaises(TTRDeadlineExceeded,
+                              self.client.get_unread_count)
+        self.assertEqual(self.server.ops()[-1], 'login')
+
+    def test_partial_paging(self):
+        self.server.delay = {'getHeadlines': 0.2}
+        with deadline(0.5, partial=True) as d:
+            headlines = list(self.client.iter_headlines(1, page_size=2))
+        self.assertTrue(d.truncated)
+        self.assertTrue(2 <= len(headlines) < 20)
+        with deadline(0.1):
+            self.assertRaises(TTRDeadlineExceeded, list,
+                              self.client.iter_headlines(1, page_size=2))
+
+    def test_scheduler_wait(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        self.client.scheduler = scheduler
+        scheduler.acquire()
+        try:
+            with deadline(0.2):
+                self.assertRaises(TTRDeadlineExceeded,
+                                  self.client.get_unread_count)
+        finally:
+            scheduler.release()
+        self.assertEqual(scheduler.stats()['classes']['interactive']
+                         ['queue_depth'], 0)
+        self.assertEqual(self.client.get_unread_count(), 20)
+
+    def test_coalesced_request(self):
+        self.server.delay = {'getUnread': 1.5}
+        leader = threading.Thread(target=self.client.get_unread_count)
+        leader.start()
+        time.sleep(0.2)
+        start = time.time()
+        with deadline(0.3):
+            self.assertRaises(TTRDeadlineExceeded,
+                              self.client.get_unread_count)
+        self.assertTrue(time.time() - start < 1.0)
+        leader.join()
+        self.assertEqual(self.client.stats()['coalesced_reads']['shared'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
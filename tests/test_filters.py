@@ -0,0 +1,95 @@
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient, Headline
+from ttrss.filters import FilterEngine, FilterSyntaxError, compile_filter
+
+from tests.fakeserver import FakeTTRSS
+
+
+def headline(**attr):
+    attr.setdefault('id', 1)
+    return Headline(attr, None)
+
+
+class TestFilterLanguage(unittest.TestCase):
+    def check(self, expression, expected, **attr):
+        self.assertEqual(compile_filter(expression)(headline(**attr)),
+                         expected, expression)
+
+    def test_predicates(self):
+        self.check('title ~ "py(thon)?"', True, title='Learning Python')
+        self.check('title ~ "ruby"', False, title='Learning Python')
+        self.check('title ~ "x"', False)
+        self.check('score >= 5', True, score=7)
+        self.check('score >= 5', False, score=None)
+        self.check('feed_id in (1, 2)', True, feed_id='2')
+        self.check('feed_id == 3', False, feed_id='2')
+        self.check('author == "ann"', True, author='ann')
+        self.check('tags contains "rel"', False, tags=['Release'])
+        self.check('tags contains "release"', True, tags=['Release'])
+        self.check('title contains "PYTHON"', True, title='python 3')
+        self.check('labels has "important"', True,
+                   labels=[[-1025, 'Important', '', '']])
+        self.check('labels has -1026', False,
+                   labels=[[-1025, 'Important', '', '']])
+        self.check('unread and not (marked or published)', True,
+                   unread=True, marked=False, published=False)
+        self.check('note == null', True)
+        self.check('unread in (true)', True, unread=True)
+        self.check('unread in (true, 2)', False, unread=False)
+        self.check('score in (true)', False, score=1)
+        self.check('note in (null, "x")', True)
+        self.check('tags in ("a", "b")', True, tags=['c', 'b'])
+        self.check('tags in ("a")', False, tags=['c'])
+        self.check('labels in ("x", 1)', False,
+                   labels=[[-1025, 'Important', '', '']])
+
+    def test_syntax_errors(self):
+        for expression in ('', 'title ~', 'score > "a"', 'a and or b',
+                           '(unread', 'title ~ 5', 'a $ b', 'title ~ "("'):
+            self.assertRaises(FilterSyntaxError, compile_filter, expression)
+        self.assertRaises(FilterSyntaxError, FilterEngine().add, 'bad',
+                          'title ~ "[a-"')
+
+
+class TestFilterEngine(unittest.TestCase):
+    def test_shared_subexpressions(self):
+        engine = FilterEngine()
+        engine.add('a', 'unread and title ~ "python"')
+        engine.add('b', 'title ~ "python" and score > 0')
+        engine.add('c', 'not unread')
+        h = headline(title='python', unread=True, score=1)
+        self.assertEqual(engine.match(h), ['a', 'b'])
+        # The shared regular expression search is done once.
+        self.assertEqual(engine.source.count('.search('), 1)
+        self.assertEqual(engine.source.count("getattr(h, 'title'"), 1)
+
+    def test_run_applies_batched_actions(self):
+        server = FakeTTRSS()
+        try:
+            client = TTRClient(server.url, FakeTTRSS.USER,
+                               FakeTTRSS.PASSWORD)
+            client.login()
+            engine = FilterEngine(batch_size=3)
+            engine.add('feed1', 'feed_id == 1',
+                       ['mark_read', ('set_score', 5)])
+            engine.add('even', 'id in (2, 4, 6, 8)', ['mark_read'])
+            ids = engine.run(client.get_headlines(limit=100), client)
+            self.assertEqual(sorted(ids['feed1']), [1, 2, 3, 4, 5])
+            self.assertEqual(sorted(ids['even']), [2, 4, 6, 8])
+            updates = [r for r in server.requests
+                       if r['op'] == 'updateArticle']
+            # Seven distinct ids to mark read and five to set the score of,
+            # in batches of three.
+            self.assertEqual(len(updates), 5)
+            self.assertEqual(
+                sorted(a for a, v in server.articles.items()
+                       if not v['unread']), [1, 2, 3, 4, 5, 6, 8])
+            self.assertEqual(server.articles[3]['score'], 5)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import time
+import unittest
+sys.path.insert(0, './')
+import requests
+from ttrss.client import TTRClient
+from ttrss.exceptions import TTRError, TTRHTTPError
+from ttrss.hedge import HedgePolicy, LatencyTracker
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100)
+        self.assertIsNone(tracker.percentile('getHeadlines', 95))
+        for i in range(200):
+            tracker.record('getHeadlines', i / 100.0)
+        # Only the last 100 samples, 1.00 to 1.99, are kept.
+        self.assertEqual(tracker.percentile('getHeadlines', 50), 1.5)
+        self.assertEqual(tracker.percentile('getHeadlines', 100), 1.99)
+        self.assertIsNone(tracker.percentile('getHeadlines', 50, 101))
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.policy = HedgePolicy(min_samples=5, min_delay=0.05,
+                                  backoff=0.01)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD, hedging=self.policy)
+        self.client.login()
+
+    def tearDown(self):
+        self.policy.close()
+        self.server.close()
+
+    def test_hedges_stalled_request(self):
+        for _ in range(5):
+            self.client.get_headlines(feed_id=1)
+        self.server.faults = {'getHeadlines': [2]}
+        start = time.time()
+        self.assertEqual(len(self.client.get_headlines(feed_id=1)), 5)
+        self.assertTrue(time.time() - start < 1)
+        stats = self.client.stats()['hedging']
+        self.assertEqual((stats['hedged'], stats['hedge_wins']), (1, 1))
+
+    def test_retries_server_errors(self):
+        self.server.faults = {'getLabels': [500, 500]}
+        self.assertEqual(len(self.client.get_labels()), 2)
+        self.assertEqual(self.server.ops().count('getLabels'), 3)
+        self.server.faults = {'getLabels': [500, 500, 500]}
+        self.assertRaises(TTRHTTPError, self.client.get_labels)
+        self.assertEqual(self.client.stats()['hedging']['retried'], 4)
+
+    def test_mutations_sent_once(self):
+        self.server.faults = {'updateArticle': [500]}
+        self.assertRaises(TTRHTTPError, self.client.mark_read, 1)
+        self.assertEqual(self.server.ops().count('updateArticle'), 1)
+
+    def test_connection_errors_retried(self):
+        self.server.close()
+        self.assertRaises(requests.ConnectionError, self.client.get_labels)
+        self.assertEqual(self.policy.stats()['retried'], 2)
+
+    def test_unknown_error_raised(self):
+        self.assertRaises(TTRError, self.client._get_json,
+                          {'op': 'noSuchMethod'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+sys.path.insert(0, './')
+import requests
+from ttrss.client import TTRClient
+from ttrss.journal import WriteJournal, compact
+
+from tests.fakeserver import FakeTTRSS
+
+
+def update(ids, mode, field=2, **kwargs):
+    return dict(op='updateArticle', article_ids=ids, mode=mode, field=field,
+                **kwargs)
+
+
+class TestCompact(unittest.TestCase):
+    def test_last_write_wins(self):
+        entries = [update('1,2', 0), update('1', 1), update('3', 0),
+                   update('1', 1, field=4, data=5),
+                   update('1', 1, field=4, data=7)]
+        self.assertEqual(compact(entries), [
+            update('2,3', 0), update('1', 1),
+            update('1', 1, field=4, data=7)])
+
+    def test_toggles(self):
+        entries = [update('1,2,3', 2), update('1', 2), update('3', 0),
+                   update('3', 2)]
+        self.assertEqual(compact(entries), [update('3', 1), update('2', 2)])
+
+    def test_labels_and_barriers(self):
+        catchup = {'op': 'catchupFeed', 'feed_id': 1, 'is_cat': False}
+        label = {'op': 'setArticleLabel', 'label_id': -1025,
+                 'article_ids': '1,2', 'assign': 'true'}
+        unlabel = dict(label, article_ids='2', assign='false')
+        entries = [update('1', 1), catchup, catchup, update('1', 1),
+                   label, unlabel]
+        self.assertEqual(compact(entries), [
+            update('1', 1), catchup, update('1', 1),
+            dict(unlabel), dict(label, article_ids='1')])
+
+
+class TestWriteJournal(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'journal')
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp)
+
+    def test_offline_and_replay(self):
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, journal=WriteJournal(self.path))
+        client.login()
+        url = client.url
+        client.url = 'http://127.0.0.1:9/api/'
+        client.mark_read([1, 2])
+        client.mark_unread(2)
+        client.set_score(1, 5)
+        client.mark_read(2)
+        self.assertEqual(len(WriteJournal(self.path)), 4)
+
+        client.url = url
+        self.assertEqual(client.get_unread_count(), 13)
+        self.assertEqual(self.server.articles[1]['score'], 5)
+        self.assertEqual(self.server.ops().count('updateArticle'), 2)
+        self.assertEqual(len(client.journal), 0)
+        self.assertEqual(WriteJournal(self.path).pending(), [])
+
+    def test_write_behind(self):
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, journal=WriteJournal(self.path),
+                           write_behind=True)
+        client.login()
+        for i in range(1, 6):
+            client.toggle_unread(str(i))
+        client.toggle_unread('1')
+        self.assertNotIn('updateArticle', self.server.ops())
+        self.assertEqual(client.flush_journal(), 1)
+        self.assertEqual(self.server.requests[-1]['article_ids'], '2,3,4,5')
+
+    def test_interrupted_replay_flushed_first(self):
+        with open(self.path + '.replay', 'w') as f:
+            f.write('{"article_ids": "1", "field": 2, "mode": 0, '
+                    '"op": "updateArticle"}\n')
+        journal = WriteJournal(self.path)
+        self.assertEqual(len(journal), 1)
+        self.assertEqual(len(journal.pending()), 1)
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, journal=journal)
+        client.login()
+        client.mark_unread(1)
+        self.assertTrue(self.server.articles[1]['unread'])
+        self.assertEqual(len(journal), 0)
+        self.assertFalse(os.path.exists(self.path + '.replay'))
+
+    def test_read_timeout_not_journaled(self):
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, journal=WriteJournal(self.path),
+                           timeout=0.2)
+        client.login()
+        self.server.delay = {'updateArticle': 0.5}
+        # The server may still apply it, so replaying it could apply a
+        # toggle twice.
+        self.assertRaises(requests.Timeout, client.toggle_unread, '1')
+        self.assertEqual(len(client.journal), 0)
+
+    def test_writes_wait_for_replay(self):
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, journal=WriteJournal(self.path))
+        client.login()
+        url = client.url
+        client.url = 'http://127.0.0.1:9/api/'
+        client.mark_read(1)
+        client.url = url
+        self.server.faults = {'updateArticle': [0.5]}
+        replay = threading.Thread(target=client.flush_journal)
+        replay.start()
+        time.sleep(0.1)
+        client.mark_unread(1)
+        replay.join()
+        self.assertTrue(self.server.articles[1]['unread'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gc
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.labels import LabelEngine, LabelView
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestLabels(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+        self.client.assign_label([1, 2, 3], -1025)
+        self.client.assign_label([3], -1026)
+        self.engine = LabelEngine(self.client, batch_size=2)
+
+    def tearDown(self):
+        self.server.close()
+
+    def labels(self, article_id):
+        return sorted(l[0] for l in self.server.articles[article_id]['labels'])
+
+    def label_requests(self):
+        return [r for r in self.server.requests
+                if r['op'] == 'setArticleLabel']
+
+    def test_plan(self):
+        plan = self.engine.plan({1: [-1025], 2: [], 3: [-1025, -1026],
+                                 4: [-1026], 5: [-1026], 6: [-1026]},
+                                {1: [-1025], 2: [-1025], 3: [-1025, -1026]})
+        self.assertEqual(plan, [('assign', -1026, [4, 5]),
+                                ('assign', -1026, [6]),
+                                ('unassign', -1025, [2])])
+
+    def test_apply(self):
+        before = len(self.label_requests())
+        plan = self.engine.apply({1: [-1025], 2: [-1026], 3: [], 4: []})
+        self.assertEqual(plan, [('assign', -1026, [2]),
+                                ('unassign', -1026, [3]),
+                                ('unassign', -1025, [2, 3])])
+        self.assertEqual(len(self.label_requests()) - before, 3)
+        self.assertEqual([self.labels(i) for i in (1, 2, 3, 4)],
+                         [[-1025], [-1026], [], []])
+        # Nothing left to do.
+        self.assertEqual(
+            self.engine.apply({1: [-1025], 2: [-1026], 3: [], 4: []}), [])
+
+    def test_unknown_articles(self):
+        self.assertEqual(sorted(self.engine.current([1, 999])), [1])
+        before = len(self.label_requests())
+        self.assertEqual(self.engine.apply({1: [-1025], 999: [-1025]}), [])
+        self.assertEqual(len(self.label_requests()), before)
+
+    def test_only_some_labels(self):
+        self.engine.apply({3: []}, labels=[-1026])
+        self.assertEqual(self.labels(3), [-1025])
+
+    def test_label_headlines_kwargs(self):
+        label = [l for l in self.client.get_labels() if l.id == -1025][0]
+        self.assertEqual([h.id for h in label.headlines(limit=2)], [3, 2])
+
+    def test_view(self):
+        now = [0]
+        view = self.engine.view(-1025, page_size=2, ttl=10,
+                                clock=lambda: now[0])
+        self.assertEqual(sorted(h.id for h in view), [1, 2, 3])
+        fetched = self.server.ops().count('getHeadlines')
+        self.assertEqual([h.id for h in view.page(1)], [1])
+        self.assertEqual(self.server.ops().count('getHeadlines'), fetched)
+        self.engine.apply({4: [-1025]})
+        self.assertEqual(sorted(h.id for h in view), [1, 2, 3, 4])
+        now[0] = 20
+        view.page(0)
+        # Three pages after the change, then the first one again.
+        self.assertEqual(self.server.ops().count('getHeadlines'),
+                         fetched + 4)
+
+    def test_views_not_kept(self):
+        view = self.engine.view(-1025)
+        self.assertEqual(len(self.engine._views[-1025]), 1)
+        del view
+        gc.collect()
+        self.assertEqual(len(self.engine._views[-1025]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
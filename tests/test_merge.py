@@ -0,0 +1,55 @@
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.merge import merged_headlines, top_headlines
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS(articles_per_feed=20)
+        # Feed 1 has the newest articles, then feed 3; feed 2 the oldest.
+        offsets = {1: 0, 2: 100000, 3: 30}
+        for a in self.server.articles.values():
+            position = (a['id'] - 1) % 20
+            a['updated'] = 1400000000 + position * 60 - offsets[a['feed_id']]
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+
+    def pages(self):
+        return [(r['feed_id'], r['limit'], r['skip'])
+                for r in self.server.requests if r['op'] == 'getHeadlines']
+
+    def test_top_n(self):
+        top = top_headlines(self.client, [1, 2, 3], 8, first_page=5)
+        expected = sorted(
+            self.client.get_headlines(feed_id=-4, limit=100),
+            key=lambda h: h.updated, reverse=True)[:8]
+        self.assertEqual([h.id for h in top], [h.id for h in expected])
+        self.assertEqual([h.feed_id for h in top], [1, 3] * 4)
+
+    def test_fetches_lazily(self):
+        it = merged_headlines(self.client, [1, 2, 3], first_page=5)
+        for _ in range(12):
+            next(it)
+        # Feed 2 never contributes; feeds 1 and 3 needed a second page,
+        # twice as large.
+        self.assertEqual(sorted(self.pages()), [
+            (1, 5, 0), (1, 10, 5), (2, 5, 0), (3, 5, 0), (3, 10, 5)])
+
+    def test_ascending(self):
+        merged = list(merged_headlines(self.client, [2, 1],
+                                       order_by='date_reverse'))
+        self.assertEqual(len(merged), 40)
+        dates = [h.updated for h in merged]
+        self.assertEqual(dates, sorted(dates))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from datetime import datetime
+import pickle
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient, Headline, Feed
+from ttrss import serialize
+
+from tests.fakeserver import FakeTTRSS
+
+
+class LazyClient(object):
+    lazy_models = True
+
+
+class TestLazyModels(unittest.TestCase):
+    def setUp(self):
+        self.data = {'id': '7', 'title': 'Seven', 'updated': 1400000000,
+                     'labels': [[-1025, 'Important', '', '']]}
+
+    def test_converts_on_first_access(self):
+        h = Headline(dict(self.data), LazyClient())
+        self.assertEqual(sorted(h.__dict__), ['_client', '_raw'])
+        self.assertEqual(h.id, 7)
+        self.assertEqual(h.updated, datetime.fromtimestamp(1400000000))
+        self.assertIn('updated', h.__dict__)
+        self.assertNotIn('title', h.__dict__)
+        self.assertRaises(AttributeError, getattr, h, 'missing')
+        self.assertFalse(hasattr(h, 'missing'))
+        h.title = 'Changed'
+        self.assertEqual(h.title, 'Changed')
+
+    def test_same_values_as_eager(self):
+        eager = Feed({'id': '3', 'title': 'Feed', 'last_updated': 1400000000},
+                     None)
+        lazy = Feed({'id': '3', 'title': 'Feed', 'last_updated': 1400000000},
+                    LazyClient())
+        for name in ('id', 'title', 'last_updated'):
+            self.assertEqual(getattr(lazy, name), getattr(eager, name))
+
+    def test_pickle_and_serialize(self):
+        h = Headline(dict(self.data), LazyClient())
+        for copy in (pickle.loads(pickle.dumps(h)),
+                     serialize.loads(serialize.dumps([h]))[0]):
+            self.assertNotIn('_raw', copy.__dict__)
+            self.assertEqual(copy.id, 7)
+            self.assertEqual(copy.title, 'Seven')
+            self.assertEqual(copy.updated, h.updated)
+
+    def test_client(self):
+        server = FakeTTRSS()
+        try:
+            client = TTRClient(server.url, FakeTTRSS.USER,
+                               FakeTTRSS.PASSWORD, lazy_models=True)
+            client.login()
+            article = client.get_articles(2)[0]
+            self.assertEqual(article.id, 2)
+            self.assertTrue(article.unread)
+            client.mark_read(2)
+            client.refresh_article(article)
+            self.assertFalse(article.unread)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
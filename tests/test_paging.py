@@ -0,0 +1,66 @@
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.paging import PageSizeTuner
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestPageSizeTuner(unittest.TestCase):
+    def test_converges_on_target_latency(self):
+        tuner = PageSizeTuner(target_latency=1.0, initial=20, max_size=200)
+        # 10 ms per headline: pages of 100 take a second.
+        for _ in range(20):
+            size = tuner.size('content')
+            tuner.record('content', size, size, size * 0.01, size * 1000)
+        self.assertTrue(95 <= tuner.size('content') <= 105,
+                        tuner.size('content'))
+        self.assertEqual(tuner.size('headlines'), 20)
+
+    def test_growth_and_limits(self):
+        tuner = PageSizeTuner(initial=20, max_size=200, max_bytes=50000)
+        tuner.record('a', 20, 20, 0.001, 20000)
+        self.assertEqual(tuner.size('a'), 40)
+        for _ in range(10):
+            tuner.record('a', 40, 40, 0.001, 40000)
+        # 1000 bytes per headline, at most 50000 bytes.
+        self.assertEqual(tuner.size('a'), 50)
+        tuner.server_limit(30)
+        self.assertEqual(tuner.size('a'), 30)
+        self.assertEqual(tuner.stats()['max_size'], 30)
+
+
+class TestAutoPaging(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS(feeds=1, articles_per_feed=150)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+
+    def limits(self):
+        return [r['limit'] for r in self.server.requests
+                if r['op'] == 'getHeadlines']
+
+    def test_grows_pages(self):
+        headlines = list(self.client.iter_headlines(1, page_size=None))
+        self.assertEqual(len(headlines), 150)
+        # The short last page is larger than any full page seen, so one
+        # more request makes sure it isn't the server's limit.
+        self.assertEqual(self.limits(), [60, 120, 1])
+        stats = self.client.stats()['page_sizes']
+        self.assertEqual(stats['headlines+excerpt']['pages'], 2)
+
+    def test_detects_server_limit(self):
+        self.server.max_limit = 50
+        headlines = list(self.client.iter_headlines(1, page_size=None))
+        self.assertEqual(len(set(h.id for h in headlines)), 150)
+        self.assertEqual(self.client.page_sizes.max_size, 50)
+        self.assertEqual(self.limits()[:3], [60, 1, 50])
+
+
+if __name__ == '__main__':
+    unittest.main()
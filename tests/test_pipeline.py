@@ -0,0 +1,81 @@
+import sys
+import threading
+import time
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient, Article
+from ttrss.pipeline import Pipeline
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS(feeds=3, articles_per_feed=20)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_fetch_hydrate_process_write(self):
+        def score(article):
+            self.assertIsInstance(article, Article)
+            article.score = int(article.feed_id) * 10
+            return article if article.feed_id != 3 else None
+
+        pipeline = (Pipeline(self.client, queue_size=5)
+                    .headlines(page_size=15)
+                    .articles(workers=2, batch=10)
+                    .map(score, workers=3)
+                    .write('set_score', lambda a: a.score, batch=8))
+        self.assertEqual(pipeline.run(), 40)
+        scores = dict((a['id'], a['score'])
+                      for a in self.server.articles.values())
+        self.assertEqual(set(scores[i] for i in range(1, 21)), set([10]))
+        self.assertEqual(set(scores[i] for i in range(21, 41)), set([20]))
+        self.assertEqual(set(scores[i] for i in range(41, 61)), set([0]))
+        stats = pipeline.stats()
+        self.assertEqual([s['stage'] for s in stats],
+                         ['headlines', 'articles', 'score', 'set_score'])
+        self.assertEqual(stats[0]['items_out'], 60)
+        self.assertEqual(stats[1]['items_in'], 60)
+        self.assertEqual(stats[2]['items_out'], 40)
+        self.assertEqual(stats[3]['items_in'], 40)
+        for s in stats:
+            self.assertTrue(s['max_queue'] <= 5)
+
+    def test_backpressure(self):
+        produced = []
+
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        pipeline = Pipeline(self.client, queue_size=3).source(source())
+        pipeline.map(lambda i: i * 2)
+        it = iter(pipeline)
+        self.assertEqual([next(it) for _ in range(5)], [0, 2, 4, 6, 8])
+        time.sleep(0.2)
+        # Two queues of three, plus an item held by each stage at most.
+        self.assertTrue(len(produced) <= 5 + 3 + 3 + 2, len(produced))
+        it.close()
+        self.assertTrue(all(not t.is_alive() for t in pipeline._threads))
+
+    def test_error_stops_pipeline(self):
+        def fail(i):
+            if i == 50:
+                raise ValueError('bad item')
+            return i
+
+        pipeline = Pipeline(self.client, queue_size=2).source(range(10000))
+        pipeline.map(fail, workers=2)
+        self.assertRaises(ValueError, pipeline.run)
+        self.assertEqual(pipeline.failed_stage, 'fail')
+        self.assertTrue(pipeline.stats()[0]['items_out'] < 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.hedge import HedgePolicy
+from ttrss.profiling import CallProfiler
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestCallProfiler(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.profiler = CallProfiler(threshold=0.2, keep=2,
+                                     sample_interval=0.01, cprofile=True)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD, auto_login=True,
+                                profiler=self.profiler)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_reports_slow_calls_only(self):
+        self.client.get_labels()
+        self.server.delay = {'getHeadlines': 0.3}
+        headlines = self.client.get_headlines(feed_id=1)
+        self.assertEqual(self.profiler.stats(),
+                         {'calls': 2, 'slow_calls': 1, 'reports': 1})
+        report = self.profiler.reports[0]
+        self.assertEqual(report['call'], 'get_headlines')
+        self.assertEqual(report['args'], 'feed_id=1')
+        self.assertEqual(report['requests'], 1)
+        self.assertTrue(report['bytes'] > 0)
+        self.assertTrue(report['phases']['network'] >= 0.3)
+        self.assertTrue(report['phases']['network'] <= report['duration'])
+        self.assertTrue(report['stacks'])
+        self.assertIn('get_headlines', report['profile'])
+        self.assertEqual(len(headlines), 5)
+
+    def test_login_phase_and_dump(self):
+        self.server.delay = {'login': 0.3}
+        self.client.get_labels()
+        report = self.profiler.reports[0]
+        # The login made by TTRAuth is part of sending getLabels.
+        self.assertEqual(report['requests'], 2)
+        self.assertTrue(report['phases']['login'] >= 0.3)
+        self.assertTrue(report['phases']['network'] < 0.3)
+        # An expired session: getLabels, login and getLabels again.
+        self.server.sessions.clear()
+        self.client.get_labels()
+        self.assertEqual(self.profiler.reports[1]['requests'], 3)
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'slow.json')
+            self.profiler.dump(path)
+            with open(path) as f:
+                data = json.load(f)
+            self.assertEqual(data['reports'][0]['call'], 'get_labels')
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_hedged_requests(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0.05)
+        self.addCleanup(policy.close)
+        client = TTRClient(self.server.url, FakeTTRSS.USER,
+                           FakeTTRSS.PASSWORD, hedging=policy,
+                           profiler=self.profiler)
+        client.login()
+        client.get_headlines(feed_id=1)
+        self.server.delay = {'getHeadlines': 0.3}
+        client.get_headlines(feed_id=1)
+        report = self.profiler.reports[-1]
+        self.assertEqual(policy.stats()['hedged'], 1)
+        # The slower attempt may still be running when the call returns.
+        self.assertTrue(report['requests'] >= 1)
+        self.assertTrue(report['bytes'] > 0)
+        self.assertTrue(report['phases']['network'] >= 0.3)
+
+    def test_ring_buffer(self):
+        self.server.delay = 0.2
+        for _ in range(3):
+            self.client.get_unread_count()
+        self.assertEqual(len(self.profiler.reports), 2)
+        self.assertEqual(self.profiler.stats()['slow_calls'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import sys
+import threading
+import time
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.scheduler import (RequestScheduler, TokenBucket, get_scheduler,
+                             priority, BULK, INTERACTIVE)
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(2, burst=2, clock=lambda: now[0])
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertAlmostEqual(bucket.take(), 0.5)
+        now[0] = 0.5
+        self.assertEqual(bucket.take(), 0)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_priority_order(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        order = []
+        scheduler.acquire(INTERACTIVE)
+
+        def worker(level, name):
+            with scheduler.slot(level):
+                order.append(name)
+
+        threads = [threading.Thread(target=worker, args=(BULK, 'bulk'))]
+        threads[0].start()
+        while scheduler.stats()['classes']['bulk']['queue_depth'] == 0:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=worker,
+                                        args=(INTERACTIVE, 'interactive')))
+        threads[1].start()
+        while scheduler.stats()['classes']['interactive']['queue_depth'] == 0:
+            time.sleep(0.001)
+        scheduler.release()
+        for t in threads:
+            t.join()
+        self.assertEqual(order, ['interactive', 'bulk'])
+        stats = scheduler.stats()
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['classes']['bulk']['requests'], 1)
+        self.assertTrue(stats['classes']['bulk']['max_wait'] > 0)
+
+    def test_concurrency_cap(self):
+        scheduler = RequestScheduler(max_concurrency=2)
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def worker():
+            with scheduler.slot():
+                with lock:
+                    active[0] += 1
+                    active[1] = max(active)
+                time.sleep(0.01)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(active[1], 2)
+
+    def test_client(self):
+        server = FakeTTRSS()
+        try:
+            scheduler = get_scheduler(server.url, max_concurrency=2, rate=100)
+            self.assertIs(get_scheduler(server.url), scheduler)
+            client = TTRClient(server.url, FakeTTRSS.USER, FakeTTRSS.PASSWORD,
+                               scheduler=scheduler)
+            client.login()
+            with priority(BULK):
+                client.get_unread_count()
+            classes = client.stats()['scheduler']['classes']
+            self.assertEqual(classes['interactive']['requests'], 1)
+            self.assertEqual(classes['bulk']['requests'], 1)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import pickle
+import sys
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import Headline, Feed
+from ttrss import serialize
+
+
+class FakeClient(object):
+    pass
+
+
+class TestSerialize(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.objects = [
+            Headline({'id': '1', 'title': 'One', 'updated': 1400000000},
+                     self.client),
+            Headline({'id': '2', 'title': 'Two', 'updated': 1400000100},
+                     self.client),
+            Feed({'id': 3, 'title': 'Feed', 'last_updated': 1400000200},
+                 self.client),
+        ]
+
+    def test_pickle_leaves_client_behind(self):
+        h = pickle.loads(pickle.dumps(self.objects[0]))
+        self.assertIsNone(h._client)
+        self.assertEqual(h.title, 'One')
+        self.assertEqual(h.updated, self.objects[0].updated)
+        self.assertIs(h.attach(self.client)._client, self.client)
+
+    def test_copies_stay_attached(self):
+        h = self.objects[0]
+        for c in (copy.copy(h), copy.deepcopy(h)):
+            self.assertIs(c._client, self.client)
+            self.assertEqual(c.title, 'One')
+            self.assertIsNot(c, h)
+        self.assertEqual(copy.deepcopy(self.objects)[2].last_updated,
+                         self.objects[2].last_updated)
+
+    def test_round_trip(self):
+        client = FakeClient()
+        for fmt in ['marshal'] + (['msgpack'] if serialize.msgpack else []):
+            objects = serialize.loads(
+                serialize.dumps(self.objects, format=fmt), client)
+            self.assertEqual([type(o) for o in objects],
+                             [Headline, Headline, Feed])
+            for old, new in zip(self.objects, objects):
+                self.assertIs(new._client, client)
+                old_state = dict(old.__dict__, _client=client)
+                self.assertEqual(new.__dict__, old_state)
+
+    def test_rejects_other_objects(self):
+        self.assertRaises(TypeError, serialize.dumps, [object()])
+        self.assertRaises(ValueError, serialize.loads, b'xyz')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.session import FileSessionStore
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.tmp = tempfile.mkdtemp()
+        self.store = FileSessionStore(os.path.join(self.tmp, 'a', 'sid.json'))
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp)
+
+    def client(self, **kwargs):
+        return TTRClient(self.server.url, FakeTTRSS.USER, FakeTTRSS.PASSWORD,
+                         session_store=self.store, **kwargs)
+
+    def test_store(self):
+        self.assertIsNone(self.store.load('http://x/api/', 'u'))
+        self.store.save('http://x/api/', 'u', 'abc')
+        self.store.save('http://y/api/', 'u', 'def')
+        self.assertEqual(self.store.load('http://x/api/', 'u'), 'abc')
+        self.store.delete('http://x/api/', 'u')
+        self.assertIsNone(self.store.load('http://x/api/', 'u'))
+        self.assertEqual(self.store.load('http://y/api/', 'u'), 'def')
+
+    def test_reuse_across_clients(self):
+        c = self.client()
+        c.login()
+        c.get_unread_count()
+        c = self.client()
+        c.login()
+        c.get_unread_count()
+        self.assertEqual(self.server.ops(),
+                         ['login', 'getUnread', 'getUnread'])
+
+    def test_relogin_on_expiry(self):
+        self.client().login()
+        self.server.sessions.clear()
+        c = self.client()
+        c.login()
+        self.assertEqual(c.get_unread_count(), 15)
+        self.assertEqual(self.server.ops().count('login'), 2)
+        self.assertEqual(self.store.load(c.url, c.user), c.sid)
+
+    def test_logout_forgets_session(self):
+        c = self.client()
+        c.login()
+        c.logout()
+        self.assertIsNone(self.store.load(c.url, c.user))
+
+    def test_auto_login(self):
+        c = self.client(auto_login=True)
+        c.get_unread_count()
+        c = self.client(auto_login=True)
+        c.get_unread_count()
+        self.assertEqual(self.server.ops().count('login'), 1)
+        self.server.sessions.clear()
+        self.assertEqual(c.get_unread_count(), 15)
+        self.assertEqual(self.server.ops().count('login'), 2)
+
+    def test_auto_login_replaces_expired_session(self):
+        c = self.client(auto_login=True)
+        c.get_unread_count()
+        self.server.sessions.clear()
+        c = self.client(auto_login=True)
+        for _ in range(3):
+            self.assertEqual(c.get_unread_count(), 15)
+        self.assertEqual(self.server.ops(), [
+            'login', 'getUnread', 'getUnread', 'login', 'getUnread',
+            'getUnread', 'getUnread'])
+        self.assertEqual(c.sid, 'sid2')
+        self.assertEqual(self.store.load(c.url, c.user), 'sid2')
+
+
+if __name__ == '__main__':
+    unittest.main()
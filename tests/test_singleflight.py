@@ -0,0 +1,56 @@
+import sys
+import threading
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+        self.server.delay = 0.2
+
+    def tearDown(self):
+        self.server.close()
+
+    def run_threads(self, fn, n=5):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fn()))
+                   for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_reads_coalesced(self):
+        results = self.run_threads(
+            lambda: self.client.get_headlines(feed_id=1))
+        self.assertEqual(self.server.ops().count('getHeadlines'), 1)
+        self.assertEqual([len(r) for r in results], [5] * 5)
+        # Every caller gets its own objects.
+        self.assertEqual(len(set(id(r[0]) for r in results)), 5)
+        self.assertEqual(self.client.stats()['coalesced_reads']['shared'], 4)
+
+    def test_different_params_not_coalesced(self):
+        threads = [threading.Thread(target=self.client.get_headlines,
+                                    kwargs={'feed_id': i})
+                   for i in (1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.server.ops().count('getHeadlines'), 2)
+
+    def test_writes_not_coalesced(self):
+        self.run_threads(lambda: self.client.toggle_unread(1), n=3)
+        self.assertEqual(self.server.ops().count('updateArticle'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
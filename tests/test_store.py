@@ -0,0 +1,93 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.store import ContentStore
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestContentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ContentStore(self.tmp, segment_size=200)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def reopen(self):
+        self.store.close()
+        self.store = ContentStore(self.tmp, segment_size=200)
+
+    def test_put_get_delete(self):
+        for i in range(20):
+            self.store.put(i, u'Content é {0} '.format(i) * 10)
+        self.store.put(3, u'new')
+        self.store.delete(4)
+        self.assertEqual(self.store.get(3), u'new')
+        self.assertEqual(self.store.get(5), u'Content é 5 ' * 10)
+        self.assertIsNone(self.store.get(4))
+        self.assertTrue(self.store.stats()['segments'] > 1)
+        self.reopen()
+        self.assertEqual(len(self.store), 19)
+        self.assertEqual(self.store.get(3), u'new')
+        self.assertNotIn(4, self.store)
+
+    def test_truncated_record(self):
+        self.store.put(1, u'one')
+        self.store.put(2, u'two')
+        path = os.path.join(self.tmp, '00000000.seg')
+        self.store.close()
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        self.reopen()
+        self.assertEqual(self.store.ids(), [1])
+        self.store.put(3, u'three')
+        self.reopen()
+        self.assertEqual(sorted(self.store.ids()), [1, 3])
+
+    def test_compact(self):
+        for i in range(10):
+            self.store.put(i % 3, u'version {0}'.format(i))
+        self.store.delete(2)
+        reclaimed = self.store.compact()
+        self.assertTrue(reclaimed > 0)
+        stats = self.store.stats()
+        self.assertEqual(stats['live_bytes'], stats['total_bytes'])
+        self.assertEqual(self.store.get(0), u'version 9')
+        self.assertEqual(self.store.get(1), u'version 7')
+        self.reopen()
+        self.assertEqual(sorted(self.store.ids()), [0, 1])
+
+
+class TestClientContentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.server = FakeTTRSS()
+        self.store = ContentStore(self.tmp)
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD, content_store=self.store)
+        self.client.login()
+
+    def tearDown(self):
+        self.server.close()
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_articles_backed_by_store(self):
+        articles = self.client.get_articles([1, 2])
+        self.assertEqual(sorted(self.store.ids()), [1, 2])
+        self.assertNotIn('content', articles[0].__dict__)
+        self.assertEqual(articles[0].content, 'Content of article 1')
+        copy = pickle.loads(pickle.dumps(articles[1]))
+        self.assertEqual(copy.content, 'Content of article 2')
+        self.assertRaises(AttributeError, getattr, articles[0], 'missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
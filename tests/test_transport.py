@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.transport import RecordingAdapter, ReplayAdapter, \
+    SESSION_PLACEHOLDER
+
+from tests.fakeserver import FakeTTRSS
+
+
+def workload(client):
+    client.login()
+    titles = [h.title for h in client.get_headlines(feed_id=1)]
+    before = client.get_unread_count()
+    client.mark_read(1)
+    return titles, before, client.get_unread_count()
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'recording.json.gz')
+        server = FakeTTRSS()
+        self.url = server.url
+        server.delay = {'getHeadlines': 0.2}
+        try:
+            recorder = RecordingAdapter(self.path)
+            client = TTRClient(server.url, FakeTTRSS.USER, FakeTTRSS.PASSWORD,
+                               transport=recorder)
+            self.recorded = workload(client)
+            self.sid = client.sid
+            recorder.save()
+        finally:
+            server.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def replay(self, **kwargs):
+        client = self.client = TTRClient(
+            self.url, FakeTTRSS.USER, FakeTTRSS.PASSWORD,
+            transport=ReplayAdapter(self.path, **kwargs))
+        start = time.time()
+        result = workload(client)
+        return result, time.time() - start
+
+    def test_no_secrets(self):
+        import gzip
+        with gzip.open(self.path) as f:
+            data = f.read()
+        self.assertNotIn(FakeTTRSS.PASSWORD.encode(), data)
+        self.assertNotIn(self.sid.encode(), data)
+        self.assertIn(SESSION_PLACEHOLDER.encode(), data)
+
+    def test_replay(self):
+        result, elapsed = self.replay()
+        self.assertEqual(result, self.recorded)
+        self.assertEqual(self.client.sid, SESSION_PLACEHOLDER)
+        self.assertEqual(result[1:], (15, 14))
+        self.assertTrue(elapsed < 0.2)
+
+    def test_original_latency(self):
+        result, elapsed = self.replay(latency='original')
+        self.assertEqual(result, self.recorded)
+        self.assertTrue(elapsed >= 0.2)
+
+    def test_unknown_request(self):
+        client = TTRClient(self.url, transport=ReplayAdapter(self.path))
+        self.assertRaises(LookupError, client.get_labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
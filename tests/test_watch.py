@@ -0,0 +1,73 @@
+import asyncio
+import sys
+import time
+import unittest
+sys.path.insert(0, './')
+from ttrss.client import TTRClient
+from ttrss.watch import HeadlineWatcher
+
+from tests.fakeserver import FakeTTRSS
+
+
+class TestHeadlineWatcher(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTTRSS()
+        self.client = TTRClient(self.server.url, FakeTTRSS.USER,
+                                FakeTTRSS.PASSWORD)
+        self.client.login()
+        self.now = [time.time()]
+        self.watcher = HeadlineWatcher(
+            self.client, self.client.get_feeds(cat_id=-3), min_interval=60,
+            clock=lambda: self.now[0])
+
+    def tearDown(self):
+        self.server.close()
+
+    def add_article(self, feed_id):
+        aid = max(self.server.articles) + 1
+        self.server.articles[aid] = dict(self.server.articles[1], id=aid,
+                                         feed_id=feed_id)
+        return aid
+
+    def test_watermarks_and_batching(self):
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.watermarks(), {1: 5, 2: 10, 3: 15})
+        new = [self.add_article(1), self.add_article(3)]
+        self.assertEqual(self.watcher.poll(), [])
+        self.now[0] += 60
+        polls = self.watcher.polls
+        self.assertEqual([h.id for h in self.watcher.poll()], new)
+        # Feeds 1 and 3 share category 1 and are polled together.
+        self.assertEqual(self.watcher.polls - polls, 2)
+        self.assertEqual(self.watcher.watermarks()[3], new[1])
+
+    def test_adaptive_interval(self):
+        self.watcher.poll()
+        for _ in range(3):
+            self.now[0] = self.watcher.next_poll()
+            self.watcher.poll()
+        # Quiet feeds back off...
+        self.assertEqual(self.watcher.intervals()[1], 60 * 1.5 ** 3)
+        for _ in range(3):
+            self.now[0] = self.watcher.next_poll()
+            for _ in range(10):
+                self.add_article(1)
+            self.watcher.poll()
+        # ...and busy ones speed up again.
+        self.assertEqual(self.watcher.intervals()[1], 60)
+
+    def test_async_iterator(self):
+        self.watcher.poll()
+        self.now[0] += 60
+        aid = self.add_article(2)
+
+        async def first():
+            async for h in self.watcher:
+                self.watcher.stop()
+                return h.id
+
+        self.assertEqual(asyncio.run(first()), aid)
+
+
+if __name__ == '__main__':
+    unittest.main()
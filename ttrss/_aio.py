@@ -0,0 +1,25 @@
+"""Python 3.5+ only helpers, imported on demand."""
+import asyncio
+
+
+_done = object()
+
+
+class AsyncIterator(object):
+    """
+    Wrap a blocking iterator so that it can be consumed with ``async for``.
+    Each item is fetched in the default executor, so the event loop is not
+    blocked while waiting.
+    """
+    def __init__(self, iterator):
+        self._iterator = iterator
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_event_loop()
+        item = await loop.run_in_executor(None, next, self._iterator, _done)
+        if item is _done:
+            raise StopAsyncIteration
+        return item
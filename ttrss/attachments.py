@@ -0,0 +1,202 @@
+"""
+Downloading article attachments (enclosures) to a local cache.
+
+Headlines fetched with ``include_attachments=True`` and articles carry a list
+of attachments with a ``content_url``. ``AttachmentDownloader`` fetches them
+concurrently, streaming each one to disk in chunks, resuming interrupted
+downloads with HTTP range requests, and storing the files by the SHA-256 of
+their content, so an enclosure referenced by many articles is downloaded and
+stored only once::
+
+    >>> downloader = AttachmentDownloader('~/.cache/ttrss-python/attachments')
+    >>> paths = downloader.download(client.get_headlines(include_attachments=True))
+    >>> paths['http://example.com/episode1.mp3']
+    '/home/user/.cache/ttrss-python/attachments/objects/3f/3f2a...'
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+import requests
+
+
+def attachment_urls(items):
+    """
+    Return the attachment URLs of ``items``, which may be headlines, articles,
+    attachment dicts or URLs, without duplicates.
+    """
+    urls = []
+    seen = set()
+    for item in items:
+        if isinstance(item, dict):
+            found = [item.get('content_url')]
+        elif hasattr(item, 'attachments'):
+            found = [a.get('content_url') for a in item.attachments or []]
+        else:
+            found = [item]
+        for url in found:
+            if url and url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+class AttachmentDownloader(object):
+    def __init__(self, cache_dir, max_workers=8, per_host=2,
+                 chunk_size=64 * 1024, session=None, timeout=60):
+        """
+        :param cache_dir: Directory of the cache. It is created if needed.
+        :param max_workers: *Optional* Number of concurrent downloads.
+            Default is ``8``.
+        :param per_host: *Optional* Number of concurrent downloads from one
+            host. Default is ``2``.
+        :param chunk_size: *Optional* Number of bytes read and written at a
+            time. Default is 64 KiB.
+        :param session: *Optional* The ``requests.Session`` to download with.
+        :param timeout: *Optional* Socket timeout in seconds. Default is
+            ``60``.
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self._session = session
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._inflight = {}
+        self.errors = {}
+        self.fetched = 0
+        self.cached = 0
+        for d in ('objects', 'urls', 'partial'):
+            path = os.path.join(self.cache_dir, d)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def path_for(self, url):
+        """Return the cached file of ``url``, or ``None``."""
+        try:
+            with open(self._url_path(url)) as f:
+                digest = f.read().strip()
+        except (IOError, OSError):
+            return None
+        path = self._object_path(digest)
+        return path if os.path.exists(path) else None
+
+    def download(self, items):
+        """
+        Download the attachments of ``items`` (see ``attachment_urls``) that
+        aren't cached yet.
+
+        :return: A dict of URL -> local path for every attachment available.
+            Failed downloads are left out and recorded in ``errors``.
+        """
+        urls = attachment_urls(items)
+        executor = ThreadPoolExecutor(self.max_workers)
+        try:
+            futures = dict((url, self._submit(executor, url)) for url in urls)
+            paths = {}
+            for url, future in futures.items():
+                try:
+                    paths[url] = future.result()
+                except Exception as e:
+                    self.errors[url] = e
+            return paths
+        finally:
+            executor.shutdown()
+
+    def _submit(self, executor, url):
+        # The same URL requested again while it is downloading shares the
+        # download in progress.
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is not None:
+                return future
+            future = executor.submit(self._fetch, url)
+            self._inflight[url] = future
+        # Outside the lock: the callback runs at once if the future is done.
+        future.add_done_callback(lambda f: self._done(url))
+        return future
+
+    def _done(self, url):
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.per_host)
+            return self._hosts[host]
+
+    def _fetch(self, url):
+        path = self.path_for(url)
+        if path is not None:
+            self.cached += 1
+            return path
+
+        key = self._key(url)
+        partial = os.path.join(self.cache_dir, 'partial', key)
+        with self._host_slot(url):
+            offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+            headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+            r = self._session.get(url, headers=headers, stream=True,
+                                  timeout=self.timeout)
+            try:
+                if offset and r.status_code == 416:
+                    # The partial file already is complete.
+                    pass
+                else:
+                    r.raise_for_status()
+                    mode = 'ab' if r.status_code == 206 else 'wb'
+                    with open(partial, mode) as f:
+                        for chunk in r.iter_content(self.chunk_size):
+                            f.write(chunk)
+            finally:
+                r.close()
+
+        digest = self._hash_file(partial)
+        path = self._object_path(digest)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        if os.path.exists(path):
+            # Same content under another URL.
+            os.remove(partial)
+        else:
+            os.rename(partial, path)
+        tmp = self._url_path(url) + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(digest)
+        os.rename(tmp, self._url_path(url))
+        self.fetched += 1
+        return path
+
+    def _hash_file(self, path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _url_path(self, url):
+        return os.path.join(self.cache_dir, 'urls', self._key(url))
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
@@ -1,19 +1,33 @@
 from requests.auth import AuthBase
 import requests
 import json
+from ttrss.deadline import remaining
 from ttrss.exceptions import raise_on_error
+from ttrss.profiling import phase
 
 
 class TTRAuth(AuthBase):
-    def __init__(self, user, password, http_auth):
+    def __init__(self, user, password, http_auth, session_store=None,
+                 session=None, on_login=None):
+        """
+        :param on_login: *Optional* Called with the new session id whenever
+            this object logs in, so that a client can stop sending the old
+            one.
+        """
         self.user = user
         self.password = password
         self.http_auth = http_auth
+        self.session_store = session_store
+        self.session = session
+        self.on_login = on_login
         self.sid = None
 
     def response_hook(self, r, **kwargs):
+        if r.status_code >= 400:
+            return r
         j = json.loads(r.text)
-        if int(j['status']) == 0:
+        if int(j['status']) == 0 or \
+                j['content'].get('error') != 'NOT_LOGGED_IN':
             return r
 
         self.sid = self._get_sid(r.request.url)
@@ -23,32 +37,54 @@ class TTRAuth(AuthBase):
         j.update({'sid': self.sid})
         req = requests.Request('POST', r.request.url, auth=self.http_auth)
         req.data = json.dumps(j)
-        _r = requests.Session().send(req.prepare())
+        with phase('network'):
+            _r = (self.session or requests.Session()).send(
+                req.prepare(), timeout=remaining(kwargs.get('timeout')))
         raise_on_error(_r)
 
         return _r
 
     def __call__(self, r):
         r.register_hook('response', self.response_hook)
-            
+
         data = json.loads(r.body)
-        if 'sid' not in data:
+        if data.get('sid') is None:
             if self.sid is None:
-                self.sid = self._get_sid(r.url)
+                self.sid = self._load_sid(r.url) or self._get_sid(r.url)
             data.update({'sid': self.sid})
-            req = requests.Request('POST', r.url, auth=self.http_auth)
-            req.data = json.dumps(data)
-            return req.prepare()
+            r.prepare_body(json.dumps(data), None)
         else:
             self.sid = data['sid']
+        if self.http_auth:
+            r.prepare_auth(self.http_auth)
         return r
 
+    def _load_sid(self, url):
+        if self.session_store is None:
+            return None
+        return self.session_store.load(url, self.user)
+
     def _get_sid(self, url):
-        res = requests.post(url, auth=self.http_auth, data=json.dumps({
+        with phase('login'):
+            sid = self._request_sid(url)
+        if self.on_login is not None:
+            self.on_login(sid)
+        return sid
+
+    def _request_sid(self, url):
+        data = json.dumps({
             'op': 'login',
             'user': self.user,
             'password': self.password
-        }))
+        })
+        # An explicit auth keeps a session using this object from calling it.
+        with phase('network'):
+            res = (self.session or requests).post(
+                url, auth=self.http_auth or (), data=data,
+                timeout=remaining())
         raise_on_error(res)
         j = json.loads(res.text)
-        return j['content']['session_id']
+        sid = j['content']['session_id']
+        if self.session_store is not None:
+            self.session_store.save(url, self.user, sid)
+        return sid
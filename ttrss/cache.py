@@ -0,0 +1,189 @@
+"""
+A read cache shared by all processes on a host.
+
+``SharedCache`` keeps responses to read-only API calls in a SQLite database
+in WAL mode, so any number of processes (say, the workers of a web server)
+using the same account can read it concurrently while one of them writes.
+Every kind of response has its own time to live, and a client sending a
+change, such as marking articles read, removes the cached responses it
+makes stale for every process::
+
+    >>> cache = SharedCache('/var/cache/myapp/ttrss.db')
+    >>> client = TTRClient(url, user, password, cache=cache)
+
+Entries are kept per server and user, and the session id is not part of the
+key, so processes with different sessions share them. Every invalidation
+bumps a generation counter, and a response is only stored if no
+invalidation happened since its request was sent, so a slow read can't put
+back what a change made stale.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from ttrss.transport import request_key
+
+
+# Seconds a response is kept, per operation. Operations not listed here are
+# not cached.
+DEFAULT_TTL = {
+    'getVersion': 3600,
+    'getApiLevel': 3600,
+    'getConfig': 300,
+    'getLabels': 300,
+    'getCategories': 300,
+    'getFeedTree': 300,
+    'getFeeds': 120,
+    'getCounters': 30,
+    'getUnread': 30,
+    'getHeadlines': 60,
+    'getArticle': 300,
+    'getPref': 300,
+}
+
+_ARTICLE_STATE = ('getHeadlines', 'getArticle', 'getCounters', 'getUnread',
+                  'getFeeds', 'getCategories', 'getFeedTree')
+
+# The cached operations whose responses a change makes stale. Changes not
+# listed here invalidate everything.
+INVALIDATES = {
+    'updateArticle': _ARTICLE_STATE,
+    'catchupFeed': _ARTICLE_STATE,
+    'setArticleLabel': ('getHeadlines', 'getArticle', 'getLabels'),
+    'shareToPublished': ('getHeadlines', 'getCounters', 'getUnread',
+                         'getFeeds', 'getFeedTree'),
+}
+
+# Operations that never change anything and are never cached.
+UNCACHED = frozenset(['login', 'logout', 'isLoggedIn'])
+
+
+class SharedCache(object):
+    def __init__(self, path, ttl=None, busy_timeout=5.0, clock=time.time):
+        """
+        :param path: The database file. Its directory is created if needed.
+        :param ttl: *Optional* A dict of operation -> seconds, updating
+            ``DEFAULT_TTL``. Use ``0`` to not cache an operation.
+        :param busy_timeout: *Optional* Seconds to wait for another process
+            holding the write lock. Default is ``5``.
+        """
+        self.path = os.path.expanduser(path)
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self.busy_timeout = busy_timeout
+        self.clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        db = self._db()
+        db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                   'scope TEXT, key TEXT, op TEXT, response TEXT, '
+                   'expires REAL, PRIMARY KEY (scope, key))')
+        db.execute('CREATE INDEX IF NOT EXISTS responses_op '
+                   'ON responses (scope, op)')
+        db.execute('CREATE TABLE IF NOT EXISTS generations ('
+                   'scope TEXT PRIMARY KEY, generation INTEGER)')
+
+    def _db(self):
+        # sqlite3 connections can't be shared between threads.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def cacheable(self, op):
+        return op not in UNCACHED and self.ttl.get(op, 0) > 0
+
+    def get(self, scope, body):
+        """Return the cached response to request ``body``, or None."""
+        row = self._db().execute(
+            'SELECT response FROM responses '
+            'WHERE scope = ? AND key = ? AND expires > ?',
+            (scope, request_key(body), self.clock())).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def generation(self, scope):
+        """Return the number of invalidations of ``scope`` so far."""
+        row = self._db().execute(
+            'SELECT generation FROM generations WHERE scope = ?',
+            (scope,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def put(self, scope, body, op, response, generation=None):
+        """
+        Cache ``response`` (the response text) to request ``body``.
+
+        :param generation: *Optional* The ``generation`` of ``scope`` read
+            before sending the request. The response is dropped if the
+            scope was invalidated since. Default is ``None`` (always keep
+            it).
+        """
+        row = (scope, request_key(body), op, response,
+               self.clock() + self.ttl[op])
+        if generation is None:
+            self._db().execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)', row)
+            return
+        self._db().execute(
+            'INSERT OR REPLACE INTO responses SELECT ?, ?, ?, ?, ? '
+            'WHERE COALESCE((SELECT generation FROM generations '
+            'WHERE scope = ?), 0) = ?', row + (scope, generation))
+
+    def invalidate(self, scope, op=None):
+        """
+        Remove the cached responses that a change made with ``op`` makes
+        stale, or all of them.
+        """
+        ops = INVALIDATES.get(op)
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR IGNORE INTO generations VALUES (?, 0)',
+                       (scope,))
+            db.execute('UPDATE generations SET generation = generation + 1 '
+                       'WHERE scope = ?', (scope,))
+            if ops is None:
+                db.execute('DELETE FROM responses WHERE scope = ?', (scope,))
+            else:
+                db.execute(
+                    'DELETE FROM responses WHERE scope = ? AND op IN ({0})'
+                    .format(', '.join('?' * len(ops))),
+                    (scope,) + tuple(ops))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        with self._lock:
+            self.invalidations += 1
+
+    def purge(self):
+        """Remove expired responses, returning how many there were."""
+        return self._db().execute(
+            'DELETE FROM responses WHERE expires <= ?',
+            (self.clock(),)).rowcount
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations}
+
+    def close(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,153 @@
+"""
+Detecting what a server supports.
+
+Some request parameters were added to the API over time, and older servers
+either ignore them or fail. ``Capabilities`` asks a server for its version
+and API level once, and tells which operations and parameters it supports.
+Results are kept per server URL for the life of the process, so all clients
+of a server share a single probe::
+
+    >>> caps = get_capabilities(client)
+    >>> caps.api_level, caps.version
+    (8, (1, 7, 6))
+    >>> caps.supports('getHeadlines', 'excerpt_length')
+    False
+
+A client created with ``detect_capabilities=True`` probes the server before
+its first request and leaves out the parameters the server doesn't support,
+as well as parameters set to ``None``, which the server treats as missing
+anyway.
+"""
+import re
+import threading
+
+from ttrss.exceptions import TTRError
+
+
+# The server version (a tuple) or API level (an int) operations and their
+# parameters need, as far as documented for the Tiny Tiny RSS API. The empty
+# parameter name stands for the operation itself.
+REQUIREMENTS = {
+    'getCategories': {'include_empty': (1, 7, 6), 'enable_nested': 4},
+    'getFeeds': {'include_nested': 4},
+    'getFeedTree': {'': 5},
+    'getHeadlines': {
+        'include_attachments': (1, 5, 3),
+        'since_id': (1, 5, 6),
+        'include_nested': (1, 6, 0),
+        'order_by': 4,
+        'excerpt_length': 11,
+    },
+    'shareToPublished': {'': 4},
+    'getLabels': {'': 1},
+    'setArticleLabel': {'': 1},
+}
+
+_lock = threading.Lock()
+_registry = {}
+# One lock per server, so that a slow server doesn't hold up probing others.
+_probe_locks = {}
+
+
+def parse_version(version):
+    """Return the leading numbers of a version string as a tuple."""
+    m = re.match(r'\s*(\d+(?:\.\d+)*)', str(version))
+    if m is None:
+        return ()
+    return tuple(int(n) for n in m.group(1).split('.'))
+
+
+class Capabilities(object):
+    def __init__(self, version, api_level, requirements=None):
+        """
+        :param version: The server version string, such as ``'1.7.6'``.
+        :param api_level: The API level.
+        :param requirements: *Optional* A dict like ``REQUIREMENTS``, which
+            is used by default.
+        """
+        self.version_string = version
+        self.version = parse_version(version)
+        self.api_level = int(api_level)
+        self.requirements = REQUIREMENTS if requirements is None \
+            else requirements
+
+    def _meets(self, requirement):
+        if isinstance(requirement, tuple):
+            return self.version >= requirement
+        return self.api_level >= requirement
+
+    def supports(self, op, param=''):
+        """Whether the server supports operation ``op`` or its ``param``."""
+        needs = self.requirements.get(op, {})
+        if '' in needs and not self._meets(needs['']):
+            return False
+        if param and param in needs:
+            return self._meets(needs[param])
+        return True
+
+    def prune(self, post_data):
+        """
+        Return ``post_data`` without the parameters that are ``None`` or not
+        supported by the server.
+        """
+        op = post_data.get('op')
+        needs = self.requirements.get(op, {})
+        return dict((k, v) for k, v in post_data.items()
+                    if v is not None and
+                    (k not in needs or self._meets(needs[k])))
+
+    def as_dict(self):
+        """
+        Return the version, the API level and a map of operation ->
+        parameter -> whether it is supported.
+        """
+        features = {}
+        for op, needs in self.requirements.items():
+            features[op] = dict((param or op, self.supports(op, param))
+                                for param in needs)
+        return {'version': self.version_string, 'api_level': self.api_level,
+                'features': features}
+
+
+def get_capabilities(client, refresh=False):
+    """
+    Return the ``Capabilities`` of the server of ``client``, probing it if
+    it hasn't been yet in this process.
+    """
+    key = client.url
+    with _lock:
+        caps = _registry.get(key)
+        if caps is not None and not refresh:
+            return caps
+        probe_lock = _probe_locks.setdefault(key, threading.Lock())
+    with probe_lock:
+        with _lock:
+            caps = _registry.get(key)
+        if caps is None or refresh:
+            version = client._call({'op': 'getVersion'})['content']['version']
+            caps = Capabilities(version, _api_level(client))
+            with _lock:
+                _registry[key] = caps
+        return caps
+
+
+def _api_level(client):
+    try:
+        return client._call({'op': 'getApiLevel'})['content']['level']
+    except TTRError as e:
+        # Servers older than 1.5.8 don't know getApiLevel; the API says to
+        # take that as level 0.
+        if e.args != ('UNKNOWN_METHOD',):
+            raise
+        return 0
+
+
+def forget(url=None):
+    """Forget the capabilities probed for ``url``, or for all servers."""
+    with _lock:
+        if url is None:
+            _registry.clear()
+            return
+        if not url.endswith('/api/'):
+            url = url.rstrip('/') + '/api/'
+        _registry.pop(url, None)
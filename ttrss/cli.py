@@ -0,0 +1,293 @@
+"""
+Command line interface to Tiny Tiny RSS.
+
+The ``ttrss`` command is meant to be called from shell scripts and cron jobs,
+so it keeps startup cheap: ``requests`` and the client module are only
+imported once a command actually needs to talk to the server, and the
+session id of the last login is kept on disk so that consecutive invocations
+don't have to log in again.
+
+Many commands can be run in a single process by piping them to
+``ttrss batch``, one command per line.
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import sys
+import time
+
+from ttrss.exceptions import TTRError
+
+
+DEFAULT_SESSION_FILE = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'ttrss-python', 'session.json')
+
+
+class CommandError(Exception):
+    pass
+
+
+class Context(object):
+    """
+    State shared by all commands run in one process. The client is created,
+    and the heavy modules imported, on first use.
+    """
+    def __init__(self, args, out=None):
+        self.args = args
+        self.out = out or sys.stdout
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._connect()
+        return self._client
+
+    def _connect(self):
+        from ttrss.client import TTRClient
+        from ttrss.session import FileSessionStore
+        args = self.args
+        if not args.url:
+            raise CommandError('no server URL given (use --url or TTRSS_URL)')
+        store = None
+        if args.session_file:
+            store = FileSessionStore(args.session_file)
+        client = TTRClient(args.url, args.user, args.password,
+                           session_store=store)
+        client.login()
+        return client
+
+    def write(self, line):
+        self.out.write(line + '\n')
+
+
+def _headline_query(ctx, args):
+    """Yield headlines selected by the common feed/filter options."""
+    kwargs = {
+        'feed_id': args.feed,
+        'is_cat': args.cat,
+        'show_excerpt': False,
+    }
+    if getattr(args, 'unread', False):
+        kwargs['view_mode'] = 'unread'
+    if getattr(args, 'content', False):
+        kwargs['show_content'] = True
+    title = None
+    if getattr(args, 'title', None):
+        try:
+            title = re.compile(args.title)
+        except re.error as e:
+            raise CommandError('invalid --title pattern: {0}'.format(e))
+    cutoff = None
+    if getattr(args, 'older_than', None) is not None:
+        cutoff = time.time() - args.older_than * 86400
+    limit = args.limit
+    if limit is not None and limit <= 0:
+        return
+    # With filters, the limit applies to the headlines matching them.
+    filtered = title is not None or cutoff is not None
+    headlines = ctx.client.iter_headlines(
+        max_items=None if filtered else limit, **kwargs)
+
+    count = 0
+    for h in headlines:
+        if title is not None and not title.search(h.title):
+            continue
+        if cutoff is not None and time.mktime(h.updated.timetuple()) > cutoff:
+            continue
+        yield h
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+def _plain(obj):
+    """Return the attributes of a remote object as JSON serializable data."""
+    d = {}
+    for key, value in vars(obj).items():
+        if key.startswith('_'):
+            continue
+        if hasattr(value, 'timetuple'):
+            value = int(time.mktime(value.timetuple()))
+        d[key] = value
+    return d
+
+
+def cmd_unread(ctx, args):
+    if not args.feeds:
+        ctx.write(str(ctx.client.get_unread_count()))
+        return
+    feeds = ctx.client.get_feeds(cat_id=-3, unread_only=True)
+    for feed in feeds:
+        ctx.write(u'{0}\t{1}\t{2}'.format(feed.id, feed.unread, feed.title))
+
+
+def cmd_headlines(ctx, args):
+    for h in _headline_query(ctx, args):
+        if args.json:
+            ctx.write(json.dumps(_plain(h)))
+        else:
+            ctx.write(u'{0}\t{1}\t{2}'.format(
+                h.id, h.updated.strftime('%Y-%m-%d %H:%M'), h.title))
+
+
+def cmd_mark_read(ctx, args):
+    ids = [h.id for h in _headline_query(ctx, args)]
+    if ids and not args.dry_run:
+        ctx.client.mark_read(ids)
+    ctx.write(str(len(ids)))
+
+
+def cmd_catchup(ctx, args):
+    ctx.client.catchup_feed(args.feed_id, is_cat=args.cat)
+
+
+def cmd_export(ctx, args):
+    out = ctx.out
+    if args.output != '-':
+        out = open(args.output, 'w')
+    try:
+        for h in _headline_query(ctx, args):
+            out.write(json.dumps(_plain(h)) + '\n')
+    finally:
+        if out is not ctx.out:
+            out.close()
+
+
+def cmd_batch(ctx, args):
+    source = sys.stdin if args.file == '-' else open(args.file)
+    parser = build_parser()
+    commands = failures = 0
+    try:
+        for number, line in enumerate(source, 1):
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                continue
+            commands += 1
+            # A failing command is reported, and the others still run.
+            try:
+                if argv[0] == 'batch':
+                    raise CommandError('batch can not be nested')
+                try:
+                    sub = parser.parse_args(argv)
+                except SystemExit as e:
+                    # argparse has printed the error already.
+                    if e.code:
+                        failures += 1
+                    continue
+                # Options given to ``batch`` itself apply to every command.
+                for key in ('url', 'user', 'password', 'session_file'):
+                    setattr(sub, key, getattr(args, key))
+                sub.func(ctx, sub)
+            except (CommandError, TTRError, IOError) as e:
+                failures += 1
+                _report('line {0}: {1}'.format(number, _error_message(e)))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    if failures:
+        raise CommandError('{0} of {1} commands failed'.format(
+            failures, commands))
+
+
+def _add_query_options(p):
+    p.add_argument('--feed', type=int, default=-4,
+                   help='feed id, default -4 (all articles)')
+    p.add_argument('--cat', action='store_true',
+                   help='the feed id is a category id')
+    p.add_argument('--limit', type=int, default=None,
+                   help='stop after this many headlines')
+    p.add_argument('--unread', action='store_true',
+                   help='only unread headlines')
+    p.add_argument('--title', metavar='REGEX',
+                   help='only headlines whose title matches REGEX')
+    p.add_argument('--older-than', type=float, metavar='DAYS',
+                   help='only headlines older than DAYS days')
+
+
+def build_parser():
+    env = os.environ.get
+    parser = argparse.ArgumentParser(
+        prog='ttrss', description='Tiny Tiny RSS command line client.')
+    parser.add_argument('--url', default=env('TTRSS_URL'),
+                        help='server URL, without /api/ ($TTRSS_URL)')
+    parser.add_argument('--user', default=env('TTRSS_USER'),
+                        help='user name ($TTRSS_USER)')
+    parser.add_argument('--password', default=env('TTRSS_PASSWORD'),
+                        help='password ($TTRSS_PASSWORD)')
+    parser.add_argument('--session-file',
+                        default=env('TTRSS_SESSION_FILE', DEFAULT_SESSION_FILE),
+                        help='where to keep the session id between runs; '
+                             'an empty value disables reuse')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    commands.required = True
+
+    p = commands.add_parser('unread', help='print unread counts')
+    p.add_argument('--feeds', action='store_true',
+                   help='print per-feed counts instead of the total')
+    p.set_defaults(func=cmd_unread)
+
+    p = commands.add_parser('headlines', help='list headlines')
+    _add_query_options(p)
+    p.add_argument('--json', action='store_true',
+                   help='print one JSON object per line')
+    p.set_defaults(func=cmd_headlines)
+
+    p = commands.add_parser('mark-read',
+                            help='mark the headlines matching a query as read')
+    _add_query_options(p)
+    p.add_argument('--dry-run', action='store_true',
+                   help='only print the number of matching headlines')
+    p.set_defaults(func=cmd_mark_read, unread=True)
+
+    p = commands.add_parser('catchup', help='mark a feed as read')
+    p.add_argument('feed_id', type=int)
+    p.add_argument('--cat', action='store_true',
+                   help='the feed id is a category id')
+    p.set_defaults(func=cmd_catchup)
+
+    p = commands.add_parser('export', help='export headlines as JSON lines')
+    _add_query_options(p)
+    p.add_argument('--content', action='store_true',
+                   help='include the full article content')
+    p.add_argument('-o', '--output', default='-',
+                   help='output file, default stdout')
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('batch',
+                            help='run commands read from a file or stdin')
+    p.add_argument('file', nargs='?', default='-',
+                   help='command file, default - (stdin)')
+    p.set_defaults(func=cmd_batch)
+
+    return parser
+
+
+def _error_message(error):
+    return str(error) or type(error).__name__
+
+
+def _report(message):
+    sys.stderr.write('ttrss: {0}\n'.format(message))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    ctx = Context(args)
+    try:
+        args.func(ctx, args)
+    except CommandError as e:
+        _report(e)
+        return 2
+    # requests' errors are IOErrors, so requests needn't be imported here.
+    except (TTRError, IOError) as e:
+        _report(_error_message(e))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,43 @@
+import copy
 from datetime import datetime
 import requests
+from requests.packages.urllib3.exceptions import ConnectTimeoutError
 import json
+import threading
+import time
 from ttrss.auth import TTRAuth
-from ttrss.exceptions import raise_on_error
+from ttrss.capabilities import get_capabilities
+from ttrss.counters import UnreadCounters
+from ttrss.journal import JOURNAL_OPS
+from ttrss.paging import PageSizeTuner
+from ttrss.profiling import phase, record_bytes
+from ttrss.deadline import current_deadline, remaining
+from ttrss.exceptions import raise_on_error, TTRNotLoggedIn, \
+    TTRDeadlineExceeded
+from ttrss.singleflight import SingleFlight
+
+
+# API operations that don't change anything on the server. Identical
+# requests for these may share a single response.
+READ_OPS = frozenset([
+    'getVersion', 'getApiLevel', 'isLoggedIn', 'getUnread', 'getCounters',
+    'getCategories', 'getFeeds', 'getFeedTree', 'getLabels', 'getHeadlines',
+    'getArticle', 'getConfig', 'getPref',
+])
+
+
+class _Undelivered(Exception):
+    """A request that certainly didn't reach the server."""
+
+
+def _undelivered(error):
+    # Only a failure to connect tells that the server didn't get a request;
+    # after a read timeout or a dropped connection, it may have applied it.
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and \
+        isinstance(reason, ConnectTimeoutError)
 
 
 class TTRClient(object):
@@ -14,7 +49,12 @@ class TTRClient(object):
     represented by Python objects.  You can also update modify articles and
     feeds on the server.
     """
-    def __init__(self, url, user=None, password=None, auto_login=False, http_auth=()):
+    def __init__(self, url, user=None, password=None, auto_login=False,
+            http_auth=(), session_store=None, scheduler=None,
+            coalesce_reads=True, journal=None, write_behind=False,
+            transport=None, content_store=None, timeout=None, cache=None,
+            hedging=None, lazy_models=False, profiler=None,
+            detect_capabilities=False):
         """
         Instantiate a new client.
 
@@ -25,32 +65,120 @@ class TTRClient(object):
         :param auto_login: *Optional* Automatically login upon instantiation,
             and re-login
         when a session cookie expires.
+        :param session_store: *Optional* A session store, such as
+            ``ttrss.session.FileSessionStore``, used to persist the session id
+            across process restarts. A stored session id is reused without
+            logging in, and the client only logs in again once the server
+            answers ``NOT_LOGGED_IN``.
+        :param scheduler: *Optional* A ``ttrss.scheduler.RequestScheduler``
+            every request has to pass through. Use
+            ``ttrss.scheduler.get_scheduler`` to share one between all clients
+            of a server.
+        :param coalesce_reads: *Optional* When several threads send an
+            identical read-only request at the same time, only send it once
+            and let them all share the response. Default is ``True``.
+        :param journal: *Optional* A ``ttrss.journal.WriteJournal``. Article
+            updates that can't be sent because connecting to the server
+            fails are written to the journal instead of failing, and sent
+            with the next successful request or by ``flush_journal()``.
+        :param write_behind: *Optional* Write every article update to the
+            journal and return at once, leaving the sending to
+            ``flush_journal()``. Requires ``journal``. Default is ``False``.
+        :param transport: *Optional* A ``requests`` transport adapter to send
+            requests to the server with, such as the recording and replaying
+            adapters in ``ttrss.transport``.
+        :param content_store: *Optional* A ``ttrss.store.ContentStore``.
+            The content of articles fetched is kept in the store instead of
+            in the ``Article`` objects, and read back when it is used.
+        :param timeout: *Optional* Seconds to wait for the server before a
+            request fails with ``requests.Timeout``. Inside a
+            ``ttrss.deadline.deadline`` block, requests are also limited to
+            the time left. Like the ``timeout`` of ``requests``, this limits
+            connecting and every single read from the socket, not the time
+            the whole response takes. Default is ``None`` (no limit).
+        :param cache: *Optional* A ``ttrss.cache.SharedCache``. Read-only
+            requests are answered from it while fresh, and changes sent by
+            the client remove the cached responses they make stale.
+        :param hedging: *Optional* A ``ttrss.hedge.HedgePolicy``. Read-only
+            requests are sent again when they take unusually long, and
+            retried after transient failures. Other requests are always
+            sent once.
+        :param lazy_models: *Optional* Have model objects keep the decoded
+            JSON data and convert each attribute only when it is first used,
+            which is faster when few attributes of many objects are used.
+            Default is ``False``.
+        :param profiler: *Optional* A ``ttrss.profiling.CallProfiler``
+            reporting the calls of this client that are slow.
+        :param detect_capabilities: *Optional* Ask the server for its
+            version and API level before the first request (once per server
+            and process), and leave out request parameters it doesn't
+            support. See ``ttrss.capabilities``. Default is ``False``.
         """
         self.sid = None
         self.url = url + '/api/'
         self.user = user
         self.password = password
         self.http_auth = http_auth
+        self.session_store = session_store
+        self.scheduler = scheduler
+        self._inflight = SingleFlight() if coalesce_reads else None
+        self.counters = None
+        self.journal = journal
+        self.write_behind = write_behind
+        self.page_sizes = PageSizeTuner()
+        self.content_store = content_store
+        self.timeout = timeout
+        self.cache = cache
+        self.hedging = hedging
+        self.lazy_models = lazy_models
+        self.profiler = profiler
+        self.detect_capabilities = detect_capabilities
+        self._local = threading.local()
 
         self._session = requests.Session()
+        if transport is not None:
+            self._session.mount(self.url, transport)
+
+        if session_store is not None:
+            self.sid = session_store.load(self.url, user)
 
         if auto_login:
-            auth = TTRAuth(user, password, http_auth)
+            auth = TTRAuth(user, password, http_auth, session_store,
+                           self._session, self._set_sid)
             self._session.auth = auth
 
+        if profiler is not None:
+            profiler.instrument(self)
+
     def login(self):
         """
         Manually log in (i.e. request a session cookie)
 
         This method must be used if the client was not instantiated with
-        ``auto_login=True``
+        ``auto_login=True``. If the client has a session store holding a
+        session id for this server, that session is reused and no request is
+        made.
         """
+        if self.session_store is not None and self.sid is not None:
+            return
+        self._login()
+
+    def _login(self):
+        with phase('login'):
+            self._send_login()
+
+    def _send_login(self):
         r = self._get_json({
             'op': 'login',
             'user': self.user,
             'password': self.password
         })
         self.sid = r['content']['session_id']
+        if self.session_store is not None:
+            self.session_store.save(self.url, self.user, self.sid)
+
+    def _set_sid(self, sid):
+        self.sid = sid
 
     def logout(self):
         """
@@ -62,23 +190,199 @@ class TTRClient(object):
         """
         self._get_json({'op': 'logout'})
         self._session.auth = None
+        self.sid = None
+        if self.session_store is not None:
+            self.session_store.delete(self.url, self.user)
 
     def logged_in(self):
         r = self._get_json({'op': 'isLoggedIn'})
         return r['content']['status']
 
+    def track_counters(self, reconcile_interval=300, max_drift=20):
+        """
+        Keep a local model of the unread counters, updated by this client's
+        own actions instead of asking the server after each of them. Once
+        enabled, ``get_unread_count`` is answered from the model as well.
+
+        :param reconcile_interval: *Optional* Seconds after which the
+            counters are refreshed from the server. Default is ``300``.
+        :param max_drift: *Optional* Number of changes the model could not
+            account for after which the counters are refreshed early.
+            Default is ``20``.
+        :return: The ``ttrss.counters.UnreadCounters`` instance.
+        """
+        self.counters = UnreadCounters(self, reconcile_interval, max_drift)
+        return self.counters
+
+    def capabilities(self):
+        """
+        Return the ``ttrss.capabilities.Capabilities`` of the server, probing
+        it if that hasn't been done yet in this process.
+        """
+        return get_capabilities(self)
+
     def _get_json(self, post_data):
+        if self.detect_capabilities and post_data['op'] not in (
+                'login', 'logout', 'getVersion', 'getApiLevel'):
+            post_data = self._prune(post_data)
+        if self.journal is not None and len(self.journal) and \
+                not self.write_behind:
+            # Send updates queued while the server was unreachable first, so
+            # that this request sees them.
+            self.flush_journal()
+        if self.journal is not None and post_data['op'] in JOURNAL_OPS:
+            r = self._journaled(post_data)
+        else:
+            r = self._call(post_data)
+        if self.counters is not None:
+            self.counters.observe(post_data, r)
+        return r
+
+    def _prune(self, post_data):
+        try:
+            return get_capabilities(self).prune(post_data)
+        except (requests.ConnectionError, requests.Timeout):
+            # Changes are sent as they are rather than failing on the
+            # probe, so that a journal can still queue them.
+            if post_data['op'] in READ_OPS:
+                raise
+            return post_data
+
+    def _call(self, post_data):
+        try:
+            return self._post(post_data)
+        except TTRNotLoggedIn:
+            # A persisted session id is only validated when it is used, so
+            # log in again once it turns out to have expired.
+            if self.session_store is None or \
+                    post_data['op'] in ('login', 'logout'):
+                raise
+            self._login()
+            return self._post(post_data)
+
+    def _journaled(self, post_data):
+        if not self.write_behind:
+            # Updates being replayed must reach the server before this one.
+            with self.journal.hold():
+                if not len(self.journal):
+                    try:
+                        return self._call(post_data)
+                    except requests.RequestException as e:
+                        if not _undelivered(e):
+                            raise
+        self.journal.append(post_data)
+        return {'seq': 0, 'status': 0,
+                'content': {'status': 'OK', 'queued': True}}
+
+    def flush_journal(self):
+        """
+        Send the article updates waiting in the journal, compacted.
+
+        :return: The number of requests sent.
+        """
+        return self.journal.replay(self._replay, (_Undelivered,
+                                                  TTRNotLoggedIn))
+
+    def _replay(self, post_data):
+        try:
+            return self._call(post_data)
+        except requests.RequestException as e:
+            if _undelivered(e):
+                raise _Undelivered(e)
+            raise
+
+    def _post(self, post_data):
         if post_data['op'] == 'login':
             data = {}
         else:
             data = {'sid': self.sid}
         data.update(post_data)
-        r = self._session.post(self.url, auth=self.http_auth, data=json.dumps(data))
+        body = json.dumps(data, sort_keys=True)
+        op = post_data['op']
+        cached = self.cache is not None and op in READ_OPS and \
+            self.cache.cacheable(op)
+        if cached:
+            # A change made by any process while the request is on its way
+            # bumps the generation and keeps the response out of the cache.
+            generation = self.cache.generation(self._cache_scope())
+            text = self.cache.get(self._cache_scope(), body)
+            if text is not None:
+                self._local.response_bytes = len(text)
+                record_bytes(len(text))
+                with phase('json'):
+                    return json.loads(text)
+        if self.hedging is not None and op in self.hedging.ops:
+            send = lambda: self.hedging.send(op, lambda: self._send(body))
+        else:
+            send = lambda: self._send(body)
+        if self._inflight is not None and op in READ_OPS:
+            # A request joining one in flight still honours its deadline.
+            r = self._inflight.do(body, send, remaining())
+        else:
+            r = send()
+        self._local.response_bytes = len(r.content)
+        record_bytes(len(r.content))
         raise_on_error(r)
-        return json.loads(r.text)
+        if cached:
+            self.cache.put(self._cache_scope(), body, op, r.text,
+                           generation)
+        elif self.cache is not None and op not in READ_OPS and \
+                op not in ('login', 'logout'):
+            self.cache.invalidate(self._cache_scope(), op)
+        with phase('json'):
+            return json.loads(r.text)
+
+    def _cache_scope(self):
+        return '{0} {1}'.format(self.user, self.url)
+
+    def _send(self, body):
+        # With auto_login the session's TTRAuth adds http_auth by itself;
+        # passing it here as well would override TTRAuth.
+        auth = None if self._session.auth else self.http_auth
+        d = current_deadline()
+        if d is not None:
+            d.check()
+        if self.scheduler is None:
+            return self._post_timed(body, auth, d)
+        if not self.scheduler.acquire(
+                timeout=d.remaining() if d is not None else None):
+            raise TTRDeadlineExceeded
+        try:
+            return self._post_timed(body, auth, d)
+        finally:
+            self.scheduler.release()
+
+    def _post_timed(self, body, auth, d):
+        timeout = remaining(self.timeout)
+        if timeout is not None and timeout <= 0:
+            raise TTRDeadlineExceeded
+        try:
+            with phase('network'):
+                return self._session.post(self.url, auth=auth, data=body,
+                                          timeout=timeout)
+        except requests.Timeout:
+            if d is not None and d.expired():
+                raise TTRDeadlineExceeded
+            raise
+
+    def stats(self):
+        """Return performance metrics of the optional client components."""
+        stats = {}
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats()
+        if self._inflight is not None:
+            stats['coalesced_reads'] = self._inflight.stats()
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        if self.hedging is not None:
+            stats['hedging'] = self.hedging.stats()
+        stats['page_sizes'] = self.page_sizes.stats()
+        return stats
 
     def get_unread_count(self):
         """Get total number of unread articles"""
+        if self.counters is not None:
+            return self.counters.total()
         r = self._get_json({'op': 'getUnread'})
         return int(r['content']['unread'])
 
@@ -168,7 +472,12 @@ class TTRClient(object):
         Get headlines for specified label id. Supports the same kwargs
             as ``get_headlines``, except for ``feed_id`` of course.
         """
-        feed_id = -11 - int(label_id)
+        label_id = int(label_id)
+        if label_id <= -1025:
+            # Newer servers return labels with their feed id already.
+            feed_id = label_id
+        else:
+            feed_id = -11 - label_id
         return self.get_headlines(feed_id=feed_id, **kwargs)
 
     def get_headlines(
@@ -230,6 +539,69 @@ class TTRClient(object):
         })
         return [Headline(hl, self) for hl in r['content']]
 
+    def iter_headlines(self, feed_id=-4, page_size=60, max_items=None, **kwargs):
+        """
+        Iterate over all headlines of a feed, fetching them page by page.
+
+        :param feed_id: Feed id. Default is ``-4`` (all feeds).
+        :param page_size: Number of headlines requested per page. Default is
+            ``60``, the largest page most servers return. With ``None``, the
+            size is chosen by the client's ``page_sizes`` tuner (a
+            ``ttrss.paging.PageSizeTuner``) from the time and bytes earlier
+            pages took.
+        :param max_items: *Optional* Stop after this many headlines.
+        Any other keyword arguments are passed on to ``get_headlines``.
+
+        Inside a ``ttrss.deadline.deadline`` block with ``partial=True``,
+        iteration stops when the time is up, after the headlines fetched so
+        far, and the deadline is marked ``truncated``.
+        """
+        skip = kwargs.pop('skip', 0)
+        tuner = self.page_sizes if page_size is None else None
+        kind = self._page_kind(kwargs)
+        count = 0
+        while max_items is None or count < max_items:
+            limit = page_size if tuner is None else tuner.size(kind)
+            if max_items is not None:
+                limit = min(limit, max_items - count)
+            start = time.time()
+            try:
+                page = self.get_headlines(
+                    feed_id=feed_id, limit=limit, skip=skip, **kwargs)
+            except TTRDeadlineExceeded:
+                d = current_deadline()
+                if d is None or not d.partial:
+                    raise
+                d.truncated = True
+                return
+            if tuner is not None:
+                tuner.record(kind, limit, len(page), time.time() - start,
+                             getattr(self._local, 'response_bytes', 0))
+            for h in page:
+                yield h
+            count += len(page)
+            skip += len(page)
+            if len(page) < limit:
+                if tuner is None or not page or len(page) <= tuner.confirmed:
+                    break
+                # A short page larger than any seen in full may just be the
+                # most the server returns; there are more headlines if the
+                # next page isn't empty.
+                if not self.get_headlines(
+                        feed_id=feed_id, limit=1, skip=skip, **kwargs):
+                    break
+                tuner.server_limit(len(page))
+
+    def _page_kind(self, kwargs):
+        kind = ['headlines']
+        if kwargs.get('show_excerpt', True):
+            kind.append('excerpt')
+        if kwargs.get('show_content'):
+            kind.append('content')
+        if kwargs.get('include_attachments'):
+            kind.append('attachments')
+        return '+'.join(kind)
+
     def get_articles(self, article_id):
         """
         Get a list of articles from article ids.
@@ -286,6 +658,22 @@ class TTRClient(object):
             'assign': 'true',
         })
 
+    def unassign_label(self, article_id, label_id):
+        """
+        Remove a label from an article.
+
+        :param article_id: Article ID.
+        :param label_id: Label ID.
+        """
+        if isinstance(article_id, list):
+            article_id = ",".join([str(i) for i in article_id])
+        r = self._get_json({
+            'op': 'setArticleLabel',
+            'article_ids': article_id,
+            'label_id': label_id,
+            'assign': 'false',
+        })
+
     def mark_unread(self, article_id):
         """
         Mark an article as unread.
@@ -470,17 +858,84 @@ class TTRClient(object):
         return r['content']['value']
 
 
+def _timestamp(value):
+    return datetime.fromtimestamp(value)
+
+
 class RemoteObject(object):
     """
     This is the base class for representing remote resources as Python objects.
+
+    If the client has ``lazy_models`` set, the object keeps the decoded JSON
+    object and converts (and caches) every attribute only when it is first
+    used.
     """
+    # Functions converting attributes from their JSON value.
+    _converters = {'id': int}
+
     def __init__(self, attr, client=None):
+        if getattr(client, 'lazy_models', False):
+            # Replaces any values cached from earlier data, see
+            # refresh_article.
+            self.__dict__ = {'_client': client, '_raw': attr}
+            return
         self._client = client
+        converters = self._converters
         for key, value in attr.items():
-            if key == 'id':
-                value = int(value)
+            if key in converters:
+                value = converters[key](value)
             self.__setattr__(key, value)
 
+    def __getattr__(self, name):
+        # Only called for attributes not set yet.
+        raw = self.__dict__.get('_raw')
+        if raw is None or name not in raw:
+            raise AttributeError(name)
+        value = raw[name]
+        converter = self._converters.get(name)
+        if converter is not None:
+            value = converter(value)
+        self.__dict__[name] = value
+        return value
+
+    def __getstate__(self):
+        # The client (and its http session) stays behind when pickling.
+        raw = self.__dict__.get('_raw')
+        if raw is not None:
+            for key in raw:
+                getattr(self, key)
+        state = self.__dict__.copy()
+        state.pop('_client', None)
+        state.pop('_raw', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._client = None
+
+    # Unlike pickles, copies stay attached to the client.
+    def __copy__(self):
+        obj = type(self).__new__(type(self))
+        obj.__dict__.update(self.__dict__)
+        return obj
+
+    def __deepcopy__(self, memo):
+        obj = type(self).__new__(type(self))
+        memo[id(self)] = obj
+        client = self.__dict__.get('_client')
+        memo[id(client)] = client
+        for key, value in self.__dict__.items():
+            obj.__dict__[key] = copy.deepcopy(value, memo)
+        return obj
+
+    def attach(self, client):
+        """
+        Attach this object to ``client``, e.g. after unpickling it in another
+        process, so that its methods can talk to the server again.
+        """
+        self._client = client
+        return self
+
 
 class Category(RemoteObject):
     def feeds(self, **kwargs):
@@ -500,12 +955,7 @@ class Category(RemoteObject):
 
 
 class Feed(RemoteObject):
-    def __init__(self, attr, client):
-        super(Feed, self).__init__(attr, client)
-        try:
-            self.last_updated = datetime.fromtimestamp(self.last_updated)
-        except AttributeError:
-            pass
+    _converters = {'id': int, 'last_updated': _timestamp}
 
     def catchup(self):
         """Mark this feed as read"""
@@ -543,19 +993,14 @@ class Label(RemoteObject):
         Get a list of headlines for this label. Supports the same kwargs as
             ``Feed.headlines()``
         """
-        return self._client.get_headlines_for_label(self.id)
+        return self._client.get_headlines_for_label(self.id, **kwargs)
 
 
 class Headline(RemoteObject):
     """This class represents Headline objects. A headline is a short version
         of an article.
     """
-    def __init__(self, attr, client):
-        super(Headline, self).__init__(attr, client)
-        try:
-            self.updated = datetime.fromtimestamp(self.updated)
-        except AttributeError:
-            pass
+    _converters = {'id': int, 'updated': _timestamp}
 
     def full_article(self):
         """Get the full article corresponding to this headline"""
@@ -564,12 +1009,34 @@ class Headline(RemoteObject):
 
 
 class Article(RemoteObject):
+    _converters = {'id': int, 'updated': _timestamp}
+
     def __init__(self, attr, client):
         super(Article, self).__init__(attr, client)
-        try:
-            self.updated = datetime.fromtimestamp(self.updated)
-        except AttributeError:
-            pass
+        store = getattr(client, 'content_store', None)
+        if store is not None:
+            for values in (self.__dict__, self.__dict__.get('_raw', {})):
+                if 'content' in values:
+                    store.put(self.id, values.pop('content'))
+
+    def __getattr__(self, name):
+        # Only called for attributes not set, such as content kept in the
+        # client's content store.
+        if name == 'content':
+            client = self.__dict__.get('_client')
+            store = getattr(client, 'content_store', None)
+            if store is not None and self.id in store:
+                return store.get(self.id)
+        return super(Article, self).__getattr__(name)
+
+    def __getstate__(self):
+        state = super(Article, self).__getstate__()
+        if 'content' not in state:
+            try:
+                state['content'] = self.content
+            except AttributeError:
+                pass
+        return state
 
     def publish(self):
         """Share this article to published feed"""
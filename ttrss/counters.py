@@ -0,0 +1,155 @@
+import threading
+import time
+
+
+class UnreadCounters(object):
+    """
+    A local model of the unread counters of feeds and categories.
+
+    The counters are seeded from a single ``getCounters`` request and then
+    kept up to date from the client's own traffic: articles seen in headline
+    and article responses are remembered, and marking them read or unread,
+    toggling them or catching up a feed adjusts the counts of their feed, its
+    category and the total right away, without asking the server.
+
+    Changes the model can't account for (articles it hasn't seen, virtual
+    feeds) add to a drift count. The counters are reconciled with the server
+    the next time they are read once ``reconcile_interval`` seconds have
+    passed or the drift exceeds ``max_drift``.
+
+    Create one with ``TTRClient.track_counters()``.
+    """
+    def __init__(self, client, reconcile_interval=300, max_drift=20,
+                 clock=time.time):
+        self._client = client
+        self.reconcile_interval = reconcile_interval
+        self.max_drift = max_drift
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._feeds = {}
+        self._cats = {}
+        self._feed_cat = {}
+        self._articles = {}
+        self._total = 0
+        self._synced = None
+        self.drift = 0
+        self.reconciles = 0
+
+    def total(self):
+        """Return the total number of unread articles."""
+        self._maybe_reconcile()
+        return self._total
+
+    def feed(self, feed_id):
+        """Return the number of unread articles in a feed."""
+        self._maybe_reconcile()
+        return self._feeds.get(int(feed_id), 0)
+
+    def category(self, cat_id):
+        """Return the number of unread articles in a category."""
+        self._maybe_reconcile()
+        return self._cats.get(int(cat_id), 0)
+
+    def feeds(self):
+        """Return a dict of feed id -> unread count."""
+        self._maybe_reconcile()
+        with self._lock:
+            return dict(self._feeds)
+
+    def categories(self):
+        """Return a dict of category id -> unread count."""
+        self._maybe_reconcile()
+        with self._lock:
+            return dict(self._cats)
+
+    def reconcile(self):
+        """Replace the local counts with fresh ones from the server."""
+        if not self._feed_cat:
+            # getFeeds responses teach us the category of each feed.
+            self._client.get_feeds(cat_id=-3)
+        # The getCounters response is picked up by observe().
+        self._client._get_json({'op': 'getCounters'})
+
+    def _maybe_reconcile(self):
+        if self._synced is None or self.drift > self.max_drift or \
+                self._clock() - self._synced >= self.reconcile_interval:
+            self.reconcile()
+
+    def observe(self, post_data, response):
+        """Update the model from a successful request and its response."""
+        op = post_data['op']
+        content = response.get('content')
+        with self._lock:
+            if op == 'getCounters':
+                self._seed(content)
+            elif op == 'getFeeds':
+                for feed in content:
+                    if 'cat_id' in feed:
+                        self._feed_cat[int(feed['id'])] = int(feed['cat_id'])
+            elif op in ('getHeadlines', 'getArticle'):
+                for a in content:
+                    if 'feed_id' in a and 'unread' in a:
+                        self._articles[int(a['id'])] = \
+                            [int(a['feed_id']), bool(a['unread'])]
+            elif op == 'updateArticle' and int(post_data['field']) == 2:
+                self._update(post_data['article_ids'], int(post_data['mode']))
+            elif op == 'catchupFeed':
+                self._catchup(int(post_data['feed_id']),
+                              post_data.get('is_cat', False))
+
+    def _seed(self, counters):
+        self._feeds = {}
+        self._cats = {}
+        for c in counters:
+            if c['id'] == 'global-unread':
+                self._total = int(c['counter'])
+            elif c.get('kind') == 'cat':
+                self._cats[int(c['id'])] = int(c['counter'])
+            else:
+                try:
+                    self._feeds[int(c['id'])] = int(c['counter'])
+                except ValueError:
+                    pass
+        self._synced = self._clock()
+        self.drift = 0
+        self.reconciles += 1
+
+    def _adjust(self, feed_id, delta):
+        self._feeds[feed_id] = max(0, self._feeds.get(feed_id, 0) + delta)
+        cat_id = self._feed_cat.get(feed_id)
+        if cat_id is None:
+            self.drift += 1
+        else:
+            self._cats[cat_id] = max(0, self._cats.get(cat_id, 0) + delta)
+        self._total = max(0, self._total + delta)
+
+    def _update(self, article_ids, mode):
+        for article_id in str(article_ids).split(','):
+            if not article_id:
+                continue
+            state = self._articles.get(int(article_id))
+            if state is None:
+                self.drift += 1
+                continue
+            unread = not state[1] if mode == 2 else bool(mode)
+            if unread != state[1]:
+                state[1] = unread
+                self._adjust(state[0], 1 if unread else -1)
+
+    def _catchup(self, feed_id, is_cat):
+        if is_cat:
+            feeds = [f for f, c in self._feed_cat.items() if c == feed_id]
+        elif feed_id > 0:
+            feeds = [feed_id]
+        else:
+            # Virtual feeds and labels span other feeds.
+            self.drift += self.max_drift + 1
+            return
+        for f in feeds:
+            n = self._feeds.get(f, 0)
+            if n:
+                self._adjust(f, -n)
+        feeds = set(feeds)
+        for state in self._articles.values():
+            if state[0] in feeds:
+                state[1] = False
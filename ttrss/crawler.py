@@ -0,0 +1,215 @@
+"""
+Crawling many feeds with several worker processes.
+
+``Crawler`` splits the feeds of an account into one shard per worker
+process. Every worker logs in with its own ``TTRClient`` and fetches the
+headlines (and, by default, the full articles) of the feeds in its shard,
+sending them back to the parent through a bounded queue, so a slow consumer
+holds the workers back instead of letting results pile up in memory. A
+worker that runs out of feeds takes the remaining feeds from the end of the
+busiest other shard::
+
+    >>> crawler = Crawler(client, processes=8)
+    >>> for feed_id, articles in crawler.crawl():
+    ...     archive(feed_id, articles)
+    >>> crawler.summary
+    [{'shard': 0, 'feeds': 620, 'stolen': 3, 'items': 41230, ...}, ...]
+
+Feeds are assigned largest first (by unread count) to the shard with the
+least work, and results are sent with ``ttrss.serialize``, attached to the
+parent's client on arrival.
+"""
+import multiprocessing
+import time
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+from ttrss import serialize
+from ttrss.client import TTRClient
+
+
+class Crawler(object):
+    def __init__(self, client, processes=4, articles=True, queue_size=64,
+                 page_size=60, article_batch=200, **kwargs):
+        """
+        :param client: A logged in ``TTRClient``. Its URL and credentials are
+            used by the workers, and results are attached to it.
+        :param processes: *Optional* Number of worker processes. Default is
+            ``4``.
+        :param articles: *Optional* Fetch the full articles of the headlines
+            found. Default is ``True``.
+        :param queue_size: *Optional* Number of feeds' results that may wait
+            in the queue before the workers block. Default is ``64``.
+        :param page_size: *Optional* Headlines requested per page. Default
+            is ``60``.
+        :param article_batch: *Optional* Number of articles requested at a
+            time. Default is ``200``.
+        Any other keyword arguments are passed on to ``iter_headlines``.
+        """
+        self.client = client
+        self.processes = processes
+        self.queue_size = queue_size
+        self.config = {
+            'url': client.url[:-len('/api/')],
+            'user': client.user,
+            'password': client.password,
+            'http_auth': client.http_auth,
+            'articles': articles,
+            'page_size': page_size,
+            'article_batch': article_batch,
+            'kwargs': kwargs,
+        }
+        self.summary = []
+        self.errors = {}
+
+    def shards(self, feeds):
+        """
+        Split ``feeds`` (Feed objects or ids) into ``processes`` lists of
+        feed ids of about the same total size.
+        """
+        sized = []
+        for feed in feeds:
+            if hasattr(feed, 'id'):
+                sized.append((getattr(feed, 'unread', 0) or 0, feed.id))
+            else:
+                sized.append((0, int(feed)))
+        sized.sort(key=lambda s: -s[0])
+        shards = [[] for _ in range(self.processes)]
+        loads = [0] * self.processes
+        for size, feed_id in sized:
+            i = loads.index(min(loads))
+            shards[i].append(feed_id)
+            # Even empty feeds cost a request.
+            loads[i] += size + 1
+        return shards
+
+    def crawl(self, feeds=None):
+        """
+        Crawl ``feeds`` (Feed objects or ids), all subscribed feeds by default.
+
+        :return: A generator of ``(feed_id, items)`` in the order feeds are
+            finished, where ``items`` are articles or headlines. Feeds that
+            failed are left out and recorded in ``errors``. ``summary`` holds
+            the statistics of every shard once the generator is exhausted.
+        """
+        if feeds is None:
+            feeds = self.client.get_feeds(cat_id=-3)
+        shards = self.shards(feeds)
+        self.summary = []
+        self.errors = {}
+
+        # All shards live in one shared array, each between its own start
+        # and end index; the owner takes from the start, thieves from the end.
+        tasks = multiprocessing.Array(
+            'l', [feed_id for shard in shards for feed_id in shard] or [0])
+        bounds = multiprocessing.Array('l', 2 * self.processes)
+        offset = 0
+        for i, shard in enumerate(shards):
+            bounds[2 * i] = offset
+            offset += len(shard)
+            bounds[2 * i + 1] = offset
+        results = multiprocessing.Queue(self.queue_size)
+
+        workers = [multiprocessing.Process(
+            target=_worker, args=(i, self.config, tasks, bounds, results))
+            for i in range(self.processes)]
+        for w in workers:
+            w.daemon = True
+            w.start()
+
+        done = 0
+        try:
+            while done < len(workers):
+                try:
+                    message = results.get(timeout=1)
+                except Empty:
+                    if not any(w.is_alive() for w in workers):
+                        break
+                    continue
+                kind = message[0]
+                if kind == 'feed':
+                    _, shard, feed_id, data = message
+                    yield feed_id, serialize.loads(data, self.client)
+                elif kind == 'error':
+                    _, shard, feed_id, error = message
+                    self.errors[feed_id] = error
+                elif kind == 'done':
+                    self.summary.append(message[2])
+                    done += 1
+        finally:
+            for w in workers:
+                if done < len(workers) and w.is_alive():
+                    w.terminate()
+                w.join()
+            self.summary.sort(key=lambda s: s['shard'])
+
+
+def _take(shard, tasks, bounds):
+    """Return ``(feed_id, stolen)`` for the next feed of ``shard``, or None."""
+    with bounds.get_lock():
+        start, end = bounds[2 * shard], bounds[2 * shard + 1]
+        if start < end:
+            bounds[2 * shard] = start + 1
+            return tasks[start], False
+        shards = len(bounds) // 2
+        victim = max(range(shards),
+                     key=lambda i: bounds[2 * i + 1] - bounds[2 * i])
+        start, end = bounds[2 * victim], bounds[2 * victim + 1]
+        if start < end:
+            bounds[2 * victim + 1] = end - 1
+            return tasks[end - 1], True
+    return None
+
+
+def _worker(shard, config, tasks, bounds, results):
+    stats = {'shard': shard, 'feeds': 0, 'stolen': 0, 'items': 0,
+             'errors': 0}
+    start = time.time()
+    # Logging in once here, rather than with auto_login on the first
+    # request, reports a failed login once instead of for every feed.
+    client = TTRClient(config['url'], config['user'], config['password'],
+                       http_auth=config['http_auth'])
+    try:
+        client.login()
+    except Exception as e:
+        client = None
+        login_error = '{0}: {1}'.format(type(e).__name__, e)
+
+    while True:
+        task = _take(shard, tasks, bounds)
+        if task is None:
+            break
+        feed_id, stolen = task
+        stats['stolen'] += stolen
+        try:
+            if client is None:
+                raise RuntimeError(login_error)
+            items = _fetch(client, feed_id, config)
+        except Exception as e:
+            stats['errors'] += 1
+            results.put(('error', shard, feed_id,
+                         '{0}: {1}'.format(type(e).__name__, e)))
+            continue
+        stats['feeds'] += 1
+        stats['items'] += len(items)
+        results.put(('feed', shard, feed_id, serialize.dumps(items)))
+
+    stats['elapsed'] = time.time() - start
+    stats['items_per_second'] = (stats['items'] / stats['elapsed']
+                                 if stats['elapsed'] else 0.0)
+    results.put(('done', shard, stats))
+
+
+def _fetch(client, feed_id, config):
+    headlines = list(client.iter_headlines(
+        feed_id, page_size=config['page_size'], **config['kwargs']))
+    if not config['articles'] or not headlines:
+        return headlines
+    ids = [h.id for h in headlines]
+    batch = config['article_batch']
+    articles = []
+    for i in range(0, len(ids), batch):
+        articles.extend(client.get_articles(ids[i:i + batch]))
+    return articles
@@ -0,0 +1,106 @@
+"""
+Time budgets for operations made of several API calls.
+
+Inside a ``deadline`` block, every request the current thread makes is sent
+with a timeout of the time left, and once the time is up, requests fail with
+``TTRDeadlineExceeded`` instead of being sent. Requests sharing the response
+of an identical one in flight stop waiting for it when the time is up as
+well. The timeout is that of ``requests``, which limits connecting and each
+read from the socket, so a server trickling out a response can still overrun
+the deadline by up to the time left. Blocks can be nested; the inner one can
+only shorten the budget::
+
+    >>> from ttrss.deadline import deadline
+    >>> with deadline(2.0):
+    ...     article = headline.full_article()
+
+With ``partial=True``, paging helpers such as ``TTRClient.iter_headlines``
+stop early instead of raising, and the deadline's ``truncated`` attribute is
+set::
+
+    >>> with deadline(0.5, partial=True) as d:
+    ...     headlines = list(client.iter_headlines(feed_id))
+    >>> d.truncated
+    True
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+from ttrss.exceptions import TTRDeadlineExceeded
+
+
+_local = threading.local()
+
+
+class Deadline(object):
+    def __init__(self, seconds, partial=False, clock=time.time):
+        """
+        :param seconds: The time budget.
+        :param partial: *Optional* Let paging helpers return what they have
+            when the time is up. Default is ``False``.
+        """
+        self.clock = clock
+        self.expires = clock() + seconds
+        self.partial = partial
+        self.truncated = False
+
+    def remaining(self):
+        """Return the seconds left, never less than zero."""
+        return max(self.expires - self.clock(), 0.0)
+
+    def expired(self):
+        return self.clock() >= self.expires
+
+    def check(self):
+        """Raise ``TTRDeadlineExceeded`` if the time is up."""
+        if self.expired():
+            raise TTRDeadlineExceeded
+
+
+def current_deadline():
+    """Return the innermost ``Deadline`` of the current thread, or None."""
+    return getattr(_local, 'deadline', None)
+
+
+def remaining(default=None):
+    """Return the seconds left of the current deadline, or ``default``."""
+    d = current_deadline()
+    if d is None:
+        return default
+    if default is None:
+        return d.remaining()
+    return min(d.remaining(), default)
+
+
+@contextmanager
+def use_deadline(d):
+    """
+    Make ``d`` (a ``Deadline`` or None) the current deadline inside the
+    ``with`` block, e.g. in a thread working on behalf of another.
+    """
+    previous = current_deadline()
+    _local.deadline = d
+    try:
+        yield d
+    finally:
+        _local.deadline = previous
+
+
+@contextmanager
+def deadline(seconds, partial=False):
+    """
+    Run the requests made by the current thread inside the ``with`` block
+    within ``seconds``, and yield the ``Deadline``.
+    """
+    previous = current_deadline()
+    d = Deadline(seconds, partial)
+    if previous is not None and previous.expires < d.expires:
+        d.expires = previous.expires
+    _local.deadline = d
+    try:
+        yield d
+    finally:
+        _local.deadline = previous
+        if previous is not None and d.truncated:
+            previous.truncated = True
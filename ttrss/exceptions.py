@@ -1,19 +1,38 @@
 import json
 
 
-class TTRAuthFailure(Exception):
+class TTRError(Exception):
+    """An error reported by the server, and the base of all client errors."""
     pass
 
 
-class TTRNotLoggedIn(Exception):
+class TTRAuthFailure(TTRError):
     pass
 
 
-class TTRApiDisabled(Exception):
+class TTRNotLoggedIn(TTRError):
     pass
 
 
+class TTRApiDisabled(TTRError):
+    pass
+
+
+class TTRDeadlineExceeded(TTRError):
+    pass
+
+
+class TTRHTTPError(TTRError):
+    """A response with an HTTP error status, kept as ``response``."""
+    def __init__(self, response):
+        super(TTRHTTPError, self).__init__(
+            'HTTP {0}'.format(response.status_code))
+        self.response = response
+
+
 def raise_on_error(r):
+    if r.status_code >= 400:
+        raise TTRHTTPError(r)
     j = json.loads(r.text)
     if int(j['status']) == 0:
         return
@@ -28,3 +47,5 @@ def raise_on_error(r):
 
     if error == 'API_DISABLED':
         raise TTRApiDisabled
+
+    raise TTRError(error)
@@ -0,0 +1,430 @@
+"""
+Client-side filter rules for headlines and articles.
+
+Rules are written in a small expression language over the attributes of
+``Headline`` and ``Article`` objects::
+
+    title ~ "python|django" and not feed_id in (3, 4)
+    score >= 10 or labels has "Important"
+    unread and tags contains "release"
+
+Comparisons are ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=`` (numbers, and
+strings for the first two), ``~`` (case insensitive regular expression
+search), ``contains`` (case insensitive substring, or an item of a list),
+``in`` (one of a list of values, or for a list attribute, containing one of
+them) and ``has`` (a label, by id or caption). A bare attribute is true if
+the attribute is, and ``and``, ``or``, ``not`` and parentheses combine them.
+Missing attributes are ``null``.
+
+A ``FilterEngine`` compiles all its rules into a single Python function, so
+every attribute is read once per item and subexpressions shared between
+rules are evaluated once, and can apply the rules' actions to the matching
+articles in one request per action::
+
+    >>> engine = FilterEngine()
+    >>> engine.add('python', 'title ~ "python"', [('assign_label', -1025)])
+    >>> engine.add('noise', 'score < 0 and unread', ['mark_read'])
+    >>> engine.run(client.iter_headlines(), client)
+    {'python': [12, 40], 'noise': [7]}
+"""
+import re
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?) |
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+    (?P<op>==|!=|<=|>=|<|>|~|\(|\)|,) |
+    (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )''', re.X)
+
+_KEYWORDS = {'and', 'or', 'not', 'in', 'contains', 'has', 'true', 'false',
+             'null'}
+_CONSTANTS = {'true': True, 'false': False, 'null': None}
+_COMPARISONS = {'==', '!=', '<', '<=', '>', '>=', '~', 'contains', 'in', 'has'}
+_ORDERING = {'<', '<=', '>', '>='}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise FilterSyntaxError(
+                'Unexpected {0!r} at {1}'.format(text[pos:pos + 10], pos))
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'name' and value in _KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError('Empty filter')
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            self.error()
+        return node
+
+    def error(self):
+        if self.pos < len(self.tokens):
+            found = repr(self.tokens[self.pos][1])
+        else:
+            found = 'end of filter'
+        raise FilterSyntaxError(
+            'Unexpected {0} in {1!r}'.format(found, self.text))
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            self.error()
+        return token
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.accept('keyword', 'or'):
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or',) + tuple(nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.accept('keyword', 'and'):
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ('and',) + tuple(nodes)
+
+    def parse_not(self):
+        if self.accept('keyword', 'not'):
+            return ('not', self.parse_not())
+        if self.accept('op', '('):
+            node = self.parse_or()
+            self.expect('op', ')')
+            return node
+        field = self.expect('name')[1]
+        kind, op = self.peek()
+        if op not in _COMPARISONS or kind not in ('op', 'keyword'):
+            return ('truth', field)
+        self.pos += 1
+        if op == 'in':
+            self.expect('op', '(')
+            values = [self.parse_value()]
+            while self.accept('op', ','):
+                values.append(self.parse_value())
+            self.expect('op', ')')
+            return ('cmp', op, field, tuple(values))
+        value = self.parse_value()
+        if op in _ORDERING and not isinstance(value, (int, float)):
+            raise FilterSyntaxError(
+                '{0} needs a number in {1!r}'.format(op, self.text))
+        if op in ('~', 'contains') and not isinstance(value, string_types):
+            raise FilterSyntaxError(
+                '{0} needs a string in {1!r}'.format(op, self.text))
+        if op == '~':
+            # Bad patterns are reported when the rule is added, not when it
+            # is first evaluated.
+            try:
+                re.compile(value, re.I | re.U)
+            except re.error as e:
+                raise FilterSyntaxError('Invalid pattern {0!r} in {1!r}: {2}'
+                                        .format(value, self.text, e))
+        return ('cmp', op, field, value)
+
+    def parse_value(self):
+        kind, value = self.peek()
+        if kind in ('number', 'string'):
+            self.pos += 1
+            return value
+        if kind == 'keyword' and value in _CONSTANTS:
+            self.pos += 1
+            return _CONSTANTS[value]
+        self.error()
+
+
+def parse(expression):
+    """Return the syntax tree of ``expression`` as nested tuples."""
+    return _Parser(expression).parse()
+
+
+def _num(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _lower(value):
+    if isinstance(value, string_types):
+        return value.lower()
+    if isinstance(value, (list, tuple)):
+        return [_lower(v) for v in value]
+    return u''
+
+
+def _in(value, values):
+    # Lists, such as tags, can't be looked up in a set; their items can.
+    if isinstance(value, (list, tuple)):
+        return any(_in(v, values) for v in value
+                   if not isinstance(v, (list, tuple)))
+    try:
+        return value in values
+    except TypeError:
+        return False
+
+
+def _labels(value):
+    found = set()
+    for label in value or ():
+        if isinstance(label, (list, tuple)):
+            found.add(_num(label[0]))
+            if len(label) > 1 and isinstance(label[1], string_types):
+                found.add(label[1].lower())
+    return found
+
+
+class _Compiler(object):
+    """Generate the source of a function evaluating many rules at once."""
+    def __init__(self, trees):
+        self.trees = trees
+        self.counts = {}
+        for tree in trees:
+            self.count(tree)
+        self.namespace = {'_num': _num, '_lower': _lower,
+                          '_labels': _labels, '_in': _in}
+        self.lines = []
+        self.fields = {}
+        self.derived = {}
+        self.hoisted = {}
+        self.constants = {}
+
+    def count(self, node):
+        self.counts[node] = self.counts.get(node, 0) + 1
+        if node[0] in ('and', 'or', 'not'):
+            for child in node[1:]:
+                self.count(child)
+
+    def constant(self, value):
+        key = (type(value), value)
+        if key not in self.constants:
+            name = '_k{0}'.format(len(self.constants))
+            self.constants[key] = name
+            self.namespace[name] = value
+        return self.constants[key]
+
+    def field(self, name):
+        if name not in self.fields:
+            var = 'f{0}'.format(len(self.fields))
+            self.fields[name] = var
+            self.lines.append('{0} = getattr(h, {1!r}, None)'.format(
+                var, name))
+        return self.fields[name]
+
+    def derive(self, helper, name):
+        """Return a variable holding ``helper(field)``, computed once."""
+        key = (helper, name)
+        if key not in self.derived:
+            var = '{0}{1}'.format(helper[1], len(self.derived))
+            self.derived[key] = var
+            self.lines.append('{0} = {1}({2})'.format(
+                var, helper, self.field(name)))
+        return self.derived[key]
+
+    def expr(self, node):
+        if self.counts.get(node, 0) < 2 or node[0] == 'truth':
+            return self.raw(node)
+        if node not in self.hoisted:
+            code = self.raw(node)
+            var = 's{0}'.format(len(self.hoisted))
+            self.lines.append('{0} = {1}'.format(var, code))
+            self.hoisted[node] = var
+        return self.hoisted[node]
+
+    def raw(self, node):
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return '(' + ' {0} '.format(kind).join(
+                self.expr(child) for child in node[1:]) + ')'
+        if kind == 'not':
+            return '(not {0})'.format(self.expr(node[1]))
+        if kind == 'truth':
+            return 'bool({0})'.format(self.field(node[1]))
+        _, op, name, value = node
+        if op == '~':
+            pattern = self.constant(re.compile(value, re.I | re.U))
+            f = self.field(name)
+            return '(isinstance({0}, _str) and {1}.search({0}) ' \
+                'is not None)'.format(f, pattern)
+        if op == 'contains':
+            return '({0} in {1})'.format(
+                self.constant(value.lower()), self.derive('_lower', name))
+        if op == 'has':
+            if isinstance(value, string_types):
+                value = value.lower()
+            return '({0} in {1})'.format(
+                self.constant(value), self.derive('_labels', name))
+        if op == 'in':
+            strings = frozenset(v for v in value
+                                if not isinstance(v, (int, float)))
+            numbers = frozenset(v for v in value
+                                if isinstance(v, (int, float)) and
+                                not isinstance(v, bool))
+            # Compared by identity, so that 1 doesn't match true.
+            parts = ['{0} is {1!r}'.format(self.field(name), v)
+                     for v in sorted(set(v for v in value
+                                         if isinstance(v, bool)))]
+            if strings:
+                parts.append('_in({0}, {1})'.format(
+                    self.field(name), self.constant(strings)))
+            if numbers:
+                parts.append('{0} in {1}'.format(
+                    self.derive('_num', name), self.constant(numbers)))
+            return '(' + (' or '.join(parts) or 'False') + ')'
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            n = self.derive('_num', name)
+            code = '{0} {1} {2}'.format(n, op, self.constant(value))
+            if op in _ORDERING:
+                return '({0} is not None and {1})'.format(n, code)
+            return '(' + code + ')'
+        return '({0} {1} {2})'.format(
+            self.field(name), '==' if op == '==' else '!=',
+            self.constant(value))
+
+    def compile(self):
+        self.namespace['_str'] = string_types
+        results = [self.expr(tree) for tree in self.trees]
+        body = self.lines + ['return ({0},)'.format(', '.join(results))]
+        source = 'def _match(h):\n' + ''.join(
+            '    {0}\n'.format(line) for line in body)
+        exec(compile(source, '<ttrss.filters>', 'exec'), self.namespace)
+        return self.namespace['_match'], source
+
+
+def compile_filter(expression):
+    """Return a function telling whether an item matches ``expression``."""
+    match, _ = _Compiler([parse(expression)]).compile()
+    return lambda item: match(item)[0]
+
+
+class Rule(object):
+    def __init__(self, name, expression, actions=()):
+        """
+        :param name: Name of the rule.
+        :param expression: The filter expression.
+        :param actions: *Optional* Client methods to call with the ids of
+            matching articles: names of methods, such as ``'mark_read'``,
+            or tuples of a name and further arguments, such as
+            ``('set_score', 10)``.
+        """
+        self.name = name
+        self.expression = expression
+        self.tree = parse(expression)
+        self.actions = [(a,) if isinstance(a, string_types) else tuple(a)
+                        for a in actions]
+
+
+class FilterEngine(object):
+    def __init__(self, rules=(), batch_size=500):
+        """
+        :param rules: *Optional* ``Rule`` objects to start with.
+        :param batch_size: *Optional* Most article ids sent in one action
+            request. Default is ``500``.
+        """
+        self.rules = list(rules)
+        self.batch_size = batch_size
+        self._match = None
+        self.source = None
+
+    def add(self, name, expression, actions=()):
+        """Add a rule; see ``Rule`` for the arguments."""
+        self.rules.append(Rule(name, expression, actions))
+        self._match = None
+
+    def _compiled(self):
+        if self._match is None:
+            self._match, self.source = _Compiler(
+                [rule.tree for rule in self.rules]).compile()
+        return self._match
+
+    def match(self, item):
+        """Return the names of the rules ``item`` matches."""
+        results = self._compiled()(item)
+        return [rule.name for rule, hit in zip(self.rules, results) if hit]
+
+    def evaluate(self, items):
+        """Return a dict of rule name -> list of the matching items."""
+        match = self._compiled()
+        matches = dict((rule.name, []) for rule in self.rules)
+        lists = [matches[rule.name] for rule in self.rules]
+        for item in items:
+            for hits, hit in zip(lists, match(item)):
+                if hit:
+                    hits.append(item)
+        return matches
+
+    def run(self, items, client=None):
+        """
+        Evaluate all rules over ``items`` and, given a client, apply the
+        actions of every rule to its matching articles, with one request
+        per action and batch of ids.
+
+        :return: A dict of rule name -> list of ids of the matching items.
+        """
+        matches = self.evaluate(items)
+        ids = dict((name, [item.id for item in hits])
+                   for name, hits in matches.items())
+        if client is not None:
+            self.apply(client, ids)
+        return ids
+
+    def apply(self, client, ids):
+        """Apply the rules' actions to ``ids``, a dict as ``run`` returns."""
+        pending = {}
+        order = []
+        for rule in self.rules:
+            for action in rule.actions:
+                if action not in pending:
+                    pending[action] = []
+                    order.append(action)
+                seen = set(pending[action])
+                pending[action].extend(
+                    i for i in ids.get(rule.name, ()) if i not in seen)
+        for action in order:
+            method = getattr(client, action[0])
+            targets = pending[action]
+            for i in range(0, len(targets), self.batch_size):
+                method(targets[i:i + self.batch_size], *action[1:])
@@ -0,0 +1,193 @@
+"""
+Hedged requests and retries for read-only API calls.
+
+Now and then the server stalls a single request for seconds while others are
+answered quickly. With a ``HedgePolicy``, a read-only request that takes
+longer than a percentile of the latencies recently observed for its
+operation is sent a second time, and whichever answer comes first is used.
+Requests failing with a connection error, a timeout or a server error are
+retried after a randomized, exponentially growing pause::
+
+    >>> client = TTRClient(url, user, password,
+    ...                    hedging=HedgePolicy(percentile=95, retries=2))
+
+Changes, such as marking articles read, never go through the policy: they
+are sent once, as without it. The slower of two hedged requests is not
+cancelled; its answer is discarded.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import random
+import threading
+import time
+
+import requests
+
+from ttrss.deadline import current_deadline, use_deadline
+from ttrss.profiling import current_call, use_call
+from ttrss.scheduler import current_priority, priority
+
+
+# Read-only operations that may be sent more than once.
+HEDGE_OPS = frozenset([
+    'getVersion', 'getApiLevel', 'getUnread', 'getCounters', 'getCategories',
+    'getFeeds', 'getFeedTree', 'getLabels', 'getHeadlines', 'getArticle',
+    'getConfig', 'getPref',
+])
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class _ServerError(Exception):
+    """A response with a 5xx status, which is worth another try."""
+    def __init__(self, response):
+        super(_ServerError, self).__init__(response.status_code)
+        self.response = response
+
+
+class LatencyTracker(object):
+    """Keep the latencies of the last ``window`` requests per operation."""
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, op, seconds):
+        with self._lock:
+            if op not in self._samples:
+                self._samples[op] = deque(maxlen=self.window)
+            self._samples[op].append(seconds)
+
+    def percentile(self, op, p, min_samples=1):
+        """
+        Return the ``p``-th percentile of the latencies of ``op``, or None
+        with fewer than ``min_samples`` of them.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(op, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * p / 100.0), len(samples) - 1)
+        return samples[index]
+
+
+class HedgePolicy(object):
+    def __init__(self, percentile=95, min_delay=0.05, min_samples=20,
+                 retries=2, backoff=0.1, max_backoff=2.0, max_workers=8,
+                 window=200, ops=HEDGE_OPS):
+        """
+        :param percentile: *Optional* Percentile of the observed latencies
+            after which a request is sent again. Default is ``95``.
+        :param min_delay: *Optional* Shortest wait before a second request.
+            Default is ``0.05`` seconds.
+        :param min_samples: *Optional* Latencies observed for an operation
+            before its requests are hedged. Default is ``20``.
+        :param retries: *Optional* Retries after a transient failure.
+            Default is ``2``.
+        :param backoff: *Optional* Pause before the first retry, doubled for
+            each further one; the actual pause is a random fraction of it.
+            Default is ``0.1`` seconds.
+        :param max_backoff: *Optional* Longest pause. Default is ``2``
+            seconds.
+        :param max_workers: *Optional* Threads sending hedged requests.
+            Default is ``8``.
+        :param window: *Optional* Latencies kept per operation. Default is
+            ``200``.
+        :param ops: *Optional* The operations the policy applies to. Default
+            is ``HEDGE_OPS``.
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ops = frozenset(ops)
+        self.latencies = LatencyTracker(window)
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retried = 0
+
+    def hedge_delay(self, op):
+        """Return the seconds to wait before hedging ``op``, or None."""
+        p = self.latencies.percentile(op, self.percentile, self.min_samples)
+        if p is None:
+            return None
+        return max(p, self.min_delay)
+
+    def send(self, op, send):
+        """
+        Call ``send()``, which sends one request for ``op`` and returns the
+        response, hedging and retrying it as configured.
+        """
+        d = current_deadline()
+        level = current_priority()
+        call = current_call()
+
+        def attempt():
+            with use_deadline(d):
+                with priority(level):
+                    with use_call(call):
+                        start = time.time()
+                        r = send()
+            if r.status_code >= 500:
+                raise _ServerError(r)
+            self.latencies.record(op, time.time() - start)
+            return r
+
+        with self._lock:
+            self.requests += 1
+        tries = 0
+        while True:
+            try:
+                return self._hedged(op, attempt)
+            except (_ServerError,) + TRANSIENT_ERRORS as e:
+                error = e
+            pause = random.random() * min(self.max_backoff,
+                                          self.backoff * 2 ** tries)
+            if tries >= self.retries or \
+                    (d is not None and d.remaining() <= pause):
+                if isinstance(error, _ServerError):
+                    return error.response
+                raise error
+            tries += 1
+            with self._lock:
+                self.retried += 1
+            time.sleep(pause)
+
+    def _hedged(self, op, attempt):
+        delay = self.hedge_delay(op)
+        if delay is None:
+            return attempt()
+        first = self._executor.submit(attempt)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = self._executor.submit(attempt)
+        with self._lock:
+            self.hedged += 1
+        pending = [first, second]
+        error = None
+        while pending:
+            done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+            pending = list(not_done)
+        raise error
+
+    def stats(self):
+        """Return the counts of requests, hedges, hedges won and retries."""
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged,
+                    'hedge_wins': self.hedge_wins, 'retried': self.retried}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,225 @@
+"""
+An append-only journal of pending article updates.
+
+A client with a journal writes article updates (``updateArticle``,
+``setArticleLabel`` and ``catchupFeed``) to the journal instead of failing
+when it can't connect to the server, or always when ``write_behind`` is on,
+and sends them later. Other failures, such as a timeout waiting for the
+answer, are raised, since the server may have applied the update already.
+Before they are sent, the pending updates are compacted: repeated updates of
+the same article field collapse to the last one, pairs of toggles cancel
+out, and the remaining updates are grouped into as few requests as possible.
+"""
+from contextlib import contextmanager
+import json
+import os
+import threading
+
+
+JOURNAL_OPS = frozenset(['updateArticle', 'setArticleLabel', 'catchupFeed'])
+
+
+def _ids(value):
+    if isinstance(value, (list, tuple)):
+        return [int(i) for i in value]
+    return [int(i) for i in str(value).split(',') if i.strip()]
+
+
+def compact(entries):
+    """
+    Return a list of requests with the same effect as the ``entries``, in
+    order, but using as few requests as possible.
+
+    ``catchupFeed`` requests act as barriers: updates are only merged with
+    other updates between the same two catchups, since a catchup changes the
+    unread state of articles the journal doesn't know about.
+    """
+    result = []
+    segment = []
+    for entry in entries:
+        if entry['op'] == 'catchupFeed':
+            result.extend(_compact_segment(segment))
+            segment = []
+            if not result or result[-1] != entry:
+                result.append(entry)
+        else:
+            segment.append(entry)
+    result.extend(_compact_segment(segment))
+    return result
+
+
+def _compact_segment(entries):
+    # (field, article) -> ['set', mode, data] or ['toggle', count]
+    fields = {}
+    # (label, article) -> assign
+    labels = {}
+    for entry in entries:
+        if entry['op'] == 'updateArticle':
+            field = int(entry['field'])
+            mode = int(entry.get('mode', 0))
+            for article_id in _ids(entry['article_ids']):
+                key = (field, article_id)
+                state = fields.get(key)
+                if mode != 2:
+                    fields[key] = ['set', mode, entry.get('data')]
+                elif state is None:
+                    fields[key] = ['toggle', 1]
+                elif state[0] == 'toggle':
+                    state[1] += 1
+                else:
+                    state[1] = 0 if state[1] else 1
+        elif entry['op'] == 'setArticleLabel':
+            label = int(entry['label_id'])
+            assign = entry.get('assign') in (True, 'true', 1, '1')
+            for article_id in _ids(entry['article_ids']):
+                labels[(label, article_id)] = assign
+        else:
+            raise ValueError('Can not journal {0}'.format(entry['op']))
+
+    groups = {}
+    for (field, article_id), state in fields.items():
+        if state[0] == 'toggle':
+            if state[1] % 2 == 0:
+                continue
+            group = (field, 2, None)
+        else:
+            group = (field, state[1], state[2])
+        groups.setdefault(group, []).append(article_id)
+
+    result = []
+    for (field, mode, data), ids in sorted(groups.items(), key=repr):
+        req = {
+            'op': 'updateArticle',
+            'article_ids': ','.join(str(i) for i in sorted(ids)),
+            'mode': mode,
+            'field': field,
+        }
+        if data is not None:
+            req['data'] = data
+        result.append(req)
+
+    assigned = {}
+    for (label, article_id), assign in labels.items():
+        assigned.setdefault((label, assign), []).append(article_id)
+    for (label, assign), ids in sorted(assigned.items()):
+        result.append({
+            'op': 'setArticleLabel',
+            'article_ids': ','.join(str(i) for i in sorted(ids)),
+            'label_id': label,
+            'assign': 'true' if assign else 'false',
+        })
+    return result
+
+
+class WriteJournal(object):
+    """
+    A journal file of pending requests, one JSON object per line.
+
+    Every entry is flushed (and, unless ``fsync=False``, synced) to disk
+    before ``append`` returns, so queued updates survive a crash.
+    """
+    def __init__(self, path, fsync=True):
+        self.path = os.path.expanduser(path)
+        self.fsync = fsync
+        self.failed = []
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        # Entries left by a replay interrupted by a crash are pending too.
+        self._count = len(self._read(self.path + '.replay')) + \
+            len(self._read(self.path))
+
+    def __len__(self):
+        return self._count
+
+    def append(self, post_data):
+        """Add a request to the end of the journal."""
+        line = json.dumps(post_data, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._count += 1
+
+    @contextmanager
+    def hold(self):
+        """
+        Keep the journal from being replayed during the ``with`` block,
+        waiting for a replay in progress to finish first, so that a request
+        sent in the block can't overtake the ones being replayed.
+        """
+        with self._replay_lock:
+            yield
+
+    def pending(self):
+        """Return the journaled requests, oldest first."""
+        with self._lock:
+            return self._read(self.path + '.replay') + self._read(self.path)
+
+    def replay(self, send, transient=(Exception,)):
+        """
+        Compact the journal and ``send`` its requests one by one.
+
+        If ``send`` raises one of the ``transient`` exceptions, the requests
+        not sent yet are put back at the head of the journal and replaying
+        stops. Requests failing with any other exception are dropped and
+        recorded in ``failed``. Entries appended while replaying are kept.
+
+        :return: The number of requests sent.
+        """
+        with self._replay_lock:
+            replaying = self.path + '.replay'
+            with self._lock:
+                # A leftover from an interrupted replay goes first.
+                entries = self._read(replaying)
+                if os.path.exists(self.path):
+                    entries.extend(self._read(self.path))
+                    os.rename(self.path, replaying)
+                self._count = 0
+            if not entries:
+                return 0
+
+            requests = compact(entries)
+            sent = 0
+            while requests:
+                try:
+                    send(requests[0])
+                    sent += 1
+                except transient:
+                    break
+                except Exception as e:
+                    self.failed.append((requests[0], e))
+                requests.pop(0)
+
+            with self._lock:
+                if requests:
+                    requests.extend(self._read(self.path))
+                    self._write(self.path, requests)
+                    self._count = len(requests)
+                os.remove(replaying)
+            return sent
+
+    def _read(self, path):
+        entries = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A torn last line from a crash mid-append.
+                        pass
+        except (IOError, OSError):
+            pass
+        return entries
+
+    def _write(self, path, entries):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.rename(tmp, path)
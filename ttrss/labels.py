@@ -0,0 +1,164 @@
+"""
+Bulk label management.
+
+``LabelEngine`` takes the labels a set of articles should have, compares
+them with the labels they have, and sends only the changes, with one request
+per label, direction and batch of articles::
+
+    >>> engine = LabelEngine(client)
+    >>> engine.apply({101: [-1025], 102: [-1025, -1026], 103: []})
+    [('assign', -1025, [102]), ('unassign', -1026, [103])]
+
+``LabelView`` pages through the headlines of a label, keeping the pages it
+fetched for a while; the views made by ``LabelEngine.view`` are refreshed
+when the engine changes their label.
+"""
+import threading
+import time
+import weakref
+
+
+def _ids(value):
+    return [int(i) for i in value]
+
+
+class LabelEngine(object):
+    def __init__(self, client, batch_size=500):
+        """
+        :param client: The ``TTRClient`` to use.
+        :param batch_size: *Optional* Most articles changed in one request.
+            Default is ``500``.
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self._views = {}
+
+    def current(self, article_ids):
+        """
+        Return a dict of article id -> set of the ids of its labels, leaving
+        out the articles the server doesn't know.
+        """
+        article_ids = _ids(article_ids)
+        labels = {}
+        for start in range(0, len(article_ids), self.batch_size):
+            batch = article_ids[start:start + self.batch_size]
+            for article in self.client.get_articles(batch):
+                labels[article.id] = set(
+                    int(l[0]) for l in getattr(article, 'labels', None) or ())
+        return labels
+
+    def plan(self, desired, current, labels=None):
+        """
+        Return the changes turning ``current`` into ``desired`` labels, as a
+        list of ``('assign' or 'unassign', label_id, article_ids)``.
+
+        :param desired: A dict of article id -> the label ids it should have.
+        :param current: A dict of article id -> the label ids it has.
+        :param labels: *Optional* Only change these labels, leaving others
+            as they are. Default is all labels.
+        """
+        if labels is not None:
+            labels = set(_ids(labels))
+        changes = {}
+        for article_id, wanted in desired.items():
+            wanted = set(_ids(wanted))
+            have = set(_ids(current.get(int(article_id), ())))
+            for action, label_ids in (('assign', wanted - have),
+                                      ('unassign', have - wanted)):
+                for label_id in label_ids:
+                    if labels is None or label_id in labels:
+                        changes.setdefault((action, label_id), []).append(
+                            int(article_id))
+        plan = []
+        for (action, label_id), ids in sorted(changes.items()):
+            ids.sort()
+            for start in range(0, len(ids), self.batch_size):
+                plan.append((action, label_id,
+                             ids[start:start + self.batch_size]))
+        return plan
+
+    def apply(self, desired, labels=None, current=None):
+        """
+        Give the articles of ``desired`` the labels listed for them, removing
+        any others, and return the changes made (see ``plan``).
+
+        :param current: *Optional* The labels the articles have, if known,
+            saving fetching them. Otherwise, articles the server doesn't
+            know are skipped.
+        """
+        if current is None:
+            current = self.current(list(desired))
+            # Leave alone the articles that don't exist.
+            desired = dict((k, v) for k, v in desired.items()
+                           if int(k) in current)
+        plan = self.plan(desired, current, labels)
+        for action, label_id, ids in plan:
+            if action == 'assign':
+                self.client.assign_label(ids, label_id)
+            else:
+                self.client.unassign_label(ids, label_id)
+        for label_id in set(label_id for _, label_id, _ in plan):
+            for view in list(self._views.get(label_id, ())):
+                view.invalidate()
+        return plan
+
+    def view(self, label_id, **kwargs):
+        """
+        Return a ``LabelView`` of ``label_id`` that is refreshed when this
+        engine changes the label. Takes the arguments of ``LabelView``.
+        """
+        view = LabelView(self.client, label_id, **kwargs)
+        # Views no longer used elsewhere drop out by themselves.
+        self._views.setdefault(int(label_id), weakref.WeakSet()).add(view)
+        return view
+
+
+class LabelView(object):
+    def __init__(self, client, label_id, page_size=60, ttl=60,
+                 clock=time.time, **kwargs):
+        """
+        :param client: The ``TTRClient`` to use.
+        :param label_id: The label id.
+        :param page_size: *Optional* Headlines per page. Default is ``60``.
+        :param ttl: *Optional* Seconds a fetched page is kept. Default is
+            ``60``.
+        Any other keyword arguments are passed on to
+        ``get_headlines_for_label``.
+        """
+        self.client = client
+        self.label_id = label_id
+        self.page_size = page_size
+        self.ttl = ttl
+        self.clock = clock
+        self.kwargs = kwargs
+        self._lock = threading.Lock()
+        self._pages = {}
+
+    def page(self, number):
+        """Return the headlines on page ``number``, counting from 0."""
+        now = self.clock()
+        with self._lock:
+            cached = self._pages.get(number)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        headlines = self.client.get_headlines_for_label(
+            self.label_id, limit=self.page_size,
+            skip=number * self.page_size, **self.kwargs)
+        with self._lock:
+            self._pages[number] = (now + self.ttl, headlines)
+        return headlines
+
+    def __iter__(self):
+        number = 0
+        while True:
+            headlines = self.page(number)
+            for h in headlines:
+                yield h
+            if len(headlines) < self.page_size:
+                return
+            number += 1
+
+    def invalidate(self):
+        """Forget the pages fetched."""
+        with self._lock:
+            self._pages = {}
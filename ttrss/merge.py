@@ -0,0 +1,118 @@
+"""
+Merging the headlines of many feeds into one sorted stream.
+
+The server returns the headlines of a feed sorted by date. ``merged_headlines``
+merges such per-feed streams with a heap, fetching a feed's next page only
+when all of its headlines fetched so far have been used, so taking the first
+N headlines only downloads what can end up among them::
+
+    >>> top_headlines(client, client.get_feeds(cat_id=-3), 20)
+
+Every feed is asked for a small first page; as a feed keeps contributing,
+its pages grow up to ``page_size``. Inside a ``ttrss.deadline.deadline``
+block with ``partial=True``, feeds that run out of time are merged with the
+headlines fetched so far.
+"""
+import heapq
+from itertools import islice
+
+from ttrss.deadline import current_deadline
+from ttrss.exceptions import TTRDeadlineExceeded
+
+
+def _updated(headline):
+    return headline.updated
+
+
+class _Reversed(object):
+    """Invert the ordering of a key, for merging in descending order."""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _feed_id(feed):
+    return feed.id if hasattr(feed, 'id') else feed
+
+
+def _stream(client, feed_id, first_page, page_size, kwargs):
+    skip = 0
+    limit = first_page
+    while True:
+        try:
+            page = client.get_headlines(
+                feed_id=feed_id, limit=limit, skip=skip, **kwargs)
+        except TTRDeadlineExceeded:
+            d = current_deadline()
+            if d is None or not d.partial:
+                raise
+            d.truncated = True
+            return
+        for h in page:
+            yield h
+        if len(page) < limit:
+            return
+        skip += len(page)
+        limit = min(limit * 2, page_size)
+
+
+def merged_headlines(client, feeds, key=None, reverse=None, first_page=10,
+                     page_size=60, **kwargs):
+    """
+    Return a generator of the headlines of ``feeds`` (Feed objects or ids),
+    merged in order of ``key``.
+
+    Every feed's headlines must already come from the server sorted by
+    ``key``, which is the case for the default key and the ``order_by``
+    values of ``get_headlines``.
+
+    :param key: *Optional* Function returning the value to sort a headline
+        by. Default is the ``updated`` date.
+    :param reverse: *Optional* Largest first. Default is ``True``, unless
+        ``order_by`` is ``"date_reverse"``.
+    :param first_page: *Optional* Headlines requested from each feed at
+        first. Default is ``10``.
+    :param page_size: *Optional* Largest page requested. Default is ``60``.
+    Any other keyword arguments are passed on to ``get_headlines``.
+    """
+    if key is None:
+        key = _updated
+    if reverse is None:
+        reverse = kwargs.get('order_by') != 'date_reverse'
+    wrap = _Reversed if reverse else (lambda k: k)
+    first_page = min(first_page, page_size)
+
+    heap = []
+    for index, feed in enumerate(feeds):
+        it = _stream(client, _feed_id(feed), first_page, page_size, kwargs)
+        for h in it:
+            # The index breaks ties, keeping feeds in the order given.
+            heap.append((wrap(key(h)), index, h, it))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        _, index, h, it = heap[0]
+        yield h
+        for nxt in it:
+            heapq.heapreplace(heap, (wrap(key(nxt)), index, nxt, it))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def top_headlines(client, feeds, n, **kwargs):
+    """
+    Return the first ``n`` headlines of ``feeds`` in the order of
+    ``merged_headlines``, which takes the same keyword arguments.
+    The first page of every feed is limited to ``n`` headlines.
+    """
+    kwargs['first_page'] = min(n, kwargs.get('first_page', 10)) or 1
+    return list(islice(merged_headlines(client, feeds, **kwargs), n))
@@ -0,0 +1,97 @@
+"""
+Choosing page sizes for paginated headline fetches.
+
+How many headlines fit in one request depends on whether content is
+included, how fast the server is and how large the articles are.
+``PageSizeTuner`` measures the time and bytes per headline of every page
+and picks the next page size so that a page takes about ``target_latency``
+seconds, without going over ``max_bytes``. Requests that return different
+kinds of payload, e.g. with and without ``show_content``, are tuned
+separately. ``TTRClient.iter_headlines`` uses the client's tuner when it is
+called with ``page_size=None``.
+"""
+import threading
+
+
+class PageSizeTuner(object):
+    def __init__(self, target_latency=1.0, initial=60, min_size=10,
+                 max_size=200, max_bytes=4 * 1024 * 1024, smoothing=0.3):
+        """
+        :param target_latency: *Optional* Seconds a page should take.
+            Default is ``1.0``.
+        :param initial: *Optional* Size of the first page. Default is ``60``.
+        :param min_size: *Optional* Smallest page size. Default is ``10``.
+        :param max_size: *Optional* Largest page size. Default is ``200``,
+            the most Tiny Tiny RSS returns. It is lowered automatically when
+            the server turns out to return fewer.
+        :param max_bytes: *Optional* Largest expected response size. Default
+            is 4 MiB.
+        :param smoothing: *Optional* Weight of the newest page in the moving
+            averages. Default is ``0.3``.
+        """
+        self.target_latency = target_latency
+        self.initial = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.smoothing = smoothing
+        # The largest page the server has been seen to return in full.
+        self.confirmed = 0
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def size(self, kind):
+        """Return the page size to request next for ``kind`` of request."""
+        with self._lock:
+            state = self._kinds.get(kind)
+            if state is None:
+                return self._clamp(self.initial)
+            return state['size']
+
+    def record(self, kind, requested, items, elapsed, nbytes):
+        """
+        Record a page of ``items`` headlines out of ``requested``, which took
+        ``elapsed`` seconds and ``nbytes`` bytes.
+        """
+        with self._lock:
+            if items == requested:
+                self.confirmed = max(self.confirmed, items)
+            state = self._kinds.get(kind)
+            if state is None:
+                state = self._kinds[kind] = {
+                    'size': self._clamp(self.initial), 'pages': 0,
+                    'seconds_per_item': None, 'bytes_per_item': None}
+            state['pages'] += 1
+            if not items:
+                return
+            for name, value in (('seconds_per_item', elapsed / items),
+                                ('bytes_per_item', float(nbytes) / items)):
+                old = state[name]
+                state[name] = value if old is None else \
+                    old + self.smoothing * (value - old)
+
+            size = self.target_latency / max(state['seconds_per_item'], 1e-6)
+            if state['bytes_per_item']:
+                size = min(size, self.max_bytes / state['bytes_per_item'])
+            # Grow at most twofold per page, so a single fast page doesn't
+            # cause a huge one.
+            size = min(int(size), 2 * state['size'])
+            state['size'] = self._clamp(size)
+
+    def server_limit(self, limit):
+        """Record that the server returns no more than ``limit`` headlines."""
+        with self._lock:
+            self.max_size = max(limit, 1)
+            for state in self._kinds.values():
+                state['size'] = self._clamp(state['size'])
+
+    def _clamp(self, size):
+        return max(min(size, self.max_size), min(self.min_size, self.max_size))
+
+    def stats(self):
+        """Return the current page size and averages of every kind."""
+        with self._lock:
+            stats = {'max_size': self.max_size}
+            for kind, state in self._kinds.items():
+                stats[kind] = dict(state)
+            return stats
@@ -0,0 +1,305 @@
+"""
+Concurrent processing pipelines on top of a client.
+
+A ``Pipeline`` is a chain of stages connected by bounded queues. Every stage
+runs in its own worker threads, so headlines are being fetched while earlier
+ones are hydrated, processed and written back, and a slow stage makes the
+stages before it wait instead of letting items pile up in memory::
+
+    >>> pipeline = (Pipeline(client, queue_size=200)
+    ...             .headlines(feed_id=-4, view_mode='unread')
+    ...             .articles(workers=4)
+    ...             .map(classify, workers=8)
+    ...             .write('set_score', lambda a: a.score))
+    >>> pipeline.run()
+    >>> pipeline.stats()
+    [{'stage': 'headlines', 'items_in': 0, 'items_out': 5000, ...}, ...]
+
+With more than one worker, a stage may change the order of the items.
+"""
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+_DONE = object()
+
+
+class _Stage(object):
+    def __init__(self, pipeline, name, fn, workers, batch):
+        self.pipeline = pipeline
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch = batch
+        self.input = None
+        self.output = None
+        self._lock = threading.Lock()
+        self._running = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0
+        self.max_queue = 0
+        self.started = None
+        self.finished = None
+
+    def take(self):
+        """Return the next batch of input items, or None at the end."""
+        pipeline = self.pipeline
+        items = []
+        while len(items) < self.batch:
+            if items:
+                # Don't wait for a batch to fill up while one is ready.
+                try:
+                    item = self.input.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                item = pipeline._get(self.input)
+            if item is _DONE:
+                # Let the other workers of this stage see the end as well.
+                pipeline._put(self.input, _DONE)
+                break
+            items.append(item)
+        with self._lock:
+            self.max_queue = max(self.max_queue, self.input.qsize())
+            self.items_in += len(items)
+        return items or None
+
+    def work(self):
+        pipeline = self.pipeline
+        try:
+            if self.input is None:
+                start = time.time()
+                for item in self.fn():
+                    if pipeline._stop.is_set():
+                        break
+                    self.busy += time.time() - start
+                    self.emit([item])
+                    start = time.time()
+            else:
+                while not pipeline._stop.is_set():
+                    items = self.take()
+                    if items is None:
+                        break
+                    start = time.time()
+                    results = self.fn(items)
+                    with self._lock:
+                        self.busy += time.time() - start
+                    self.emit(results)
+        except Exception as e:
+            pipeline._fail(self, e)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                self.finished = time.time()
+                pipeline._put(self.output, _DONE)
+
+    def emit(self, results):
+        for result in results:
+            if result is None:
+                continue
+            if not self.pipeline._put(self.output, result):
+                return
+            with self._lock:
+                self.items_out += 1
+
+    def stats(self):
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0.0
+        count = self.items_in if self.input is not None else self.items_out
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'busy': self.busy,
+            'elapsed': elapsed,
+            'items_per_second': count / elapsed if elapsed else 0.0,
+            'max_queue': self.max_queue,
+        }
+
+
+class Pipeline(object):
+    def __init__(self, client, queue_size=100):
+        """
+        :param client: The ``TTRClient`` stages fetch from and write with.
+        :param queue_size: *Optional* Most items waiting between two stages.
+            Default is ``100``.
+        """
+        self.client = client
+        self.queue_size = queue_size
+        self.stages = []
+        self.error = None
+        self.failed_stage = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def source(self, iterable, name='source'):
+        """Start the pipeline with the items of ``iterable``."""
+        if self.stages:
+            raise ValueError('The pipeline already has a source')
+        self.stages.append(_Stage(self, name, lambda: iter(iterable), 1, 1))
+        return self
+
+    def headlines(self, feed_id=-4, **kwargs):
+        """
+        Start the pipeline with the headlines of ``iter_headlines``, which
+        takes the same arguments.
+        """
+        return self.source(
+            _Lazy(self.client.iter_headlines, feed_id, **kwargs), 'headlines')
+
+    def stage(self, fn, workers=1, batch=1, name=None):
+        """
+        Add a stage calling ``fn`` with lists of up to ``batch`` items, which
+        returns an iterable of the items to pass on.
+        """
+        if not self.stages:
+            raise ValueError('The pipeline needs a source first')
+        self.stages.append(_Stage(self, name or getattr(fn, '__name__',
+                                                       'stage'),
+                                  fn, workers, batch))
+        return self
+
+    def map(self, fn, workers=1, name=None):
+        """
+        Add a stage passing on ``fn(item)`` for every item, dropping items
+        for which it returns ``None``.
+        """
+        return self.stage(lambda items: [fn(item) for item in items],
+                          workers, 1, name or getattr(fn, '__name__', 'map'))
+
+    def articles(self, workers=2, batch=50):
+        """Add a stage replacing headlines by their full articles."""
+        client = self.client
+        return self.stage(
+            lambda items: client.get_articles([i.id for i in items]),
+            workers, batch, 'articles')
+
+    def write(self, method, value=None, workers=1, batch=100):
+        """
+        Add a stage calling a client method such as ``'mark_read'`` for
+        batches of items, passing the items on.
+
+        :param method: Name of a ``TTRClient`` method taking a list of
+            article ids.
+        :param value: *Optional* A further argument for the method, or a
+            function returning it for an item, such as
+            ``lambda a: a.score`` for ``'set_score'``. Items are grouped by
+            value.
+        """
+        fn = getattr(self.client, method)
+
+        def write(items):
+            groups = {}
+            order = []
+            for item in items:
+                v = value(item) if callable(value) else value
+                if v not in groups:
+                    groups[v] = []
+                    order.append(v)
+                groups[v].append(item.id)
+            for v in order:
+                if value is None:
+                    fn(groups[v])
+                else:
+                    fn(groups[v], v)
+            return items
+        return self.stage(write, workers, batch, method)
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fail(self, stage, error):
+        if self.error is None:
+            self.error = error
+            self.failed_stage = stage.name
+        self._stop.set()
+
+    def start(self):
+        """Start the worker threads of every stage."""
+        if not self.stages:
+            raise ValueError('The pipeline has no stages')
+        previous = None
+        for stage in self.stages:
+            stage.input = previous
+            stage.output = queue.Queue(self.queue_size)
+            previous = stage.output
+        now = time.time()
+        for stage in self.stages:
+            stage.started = now
+            for _ in range(stage.workers):
+                t = threading.Thread(target=stage.work)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+
+    def __iter__(self):
+        """Run the pipeline, yielding the items out of the last stage."""
+        if not self._threads:
+            self.start()
+        output = self.stages[-1].output
+        try:
+            while True:
+                item = self._get(output)
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            if self.error is None and not self._finished():
+                # The consumer stopped early.
+                self._stop.set()
+            for t in self._threads:
+                t.join()
+        if self.error is not None:
+            raise self.error
+
+    def _finished(self):
+        return all(stage.finished for stage in self.stages)
+
+    def run(self):
+        """
+        Run the pipeline to the end, discarding the items out of the last
+        stage.
+
+        :return: The number of items out of the last stage.
+        """
+        count = 0
+        for _ in self:
+            count += 1
+        return count
+
+    def stats(self):
+        """Return the throughput statistics of every stage."""
+        return [stage.stats() for stage in self.stages]
+
+
+class _Lazy(object):
+    """Call a function returning an iterable when iteration starts."""
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __iter__(self):
+        return iter(self.fn(*self.args, **self.kwargs))
@@ -0,0 +1,264 @@
+"""
+Profiling slow client calls.
+
+A ``CallProfiler`` times every public method call of a client and, for the
+calls that take longer than ``threshold`` seconds, keeps a report of where
+the time went: sending requests and waiting for the server (``network``),
+decoding responses (``json``), logging in again (``login``) and everything
+else, mostly building model objects (``other``). Optionally, the stacks of
+the calling thread are sampled while a call runs, and calls are run under
+``cProfile``; both are only kept for slow calls. The last ``keep`` reports
+are kept and can be written to a JSON file::
+
+    >>> profiler = CallProfiler(threshold=0.5, sample_interval=0.005)
+    >>> client = TTRClient(url, user, password, profiler=profiler)
+    >>> ...
+    >>> profiler.dump('slow-calls.json')
+
+Only the outermost call is profiled when client methods call each other.
+Requests that a ``ttrss.hedge.HedgePolicy`` sends from its own threads count
+towards the call they are made for.
+Generators such as ``iter_headlines`` aren't profiled themselves, but the
+calls they make are.
+"""
+from collections import deque
+from contextlib import contextmanager
+import cProfile
+import inspect
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import traceback
+
+
+PHASES = ('network', 'json', 'login')
+
+_local = threading.local()
+
+
+class _Call(object):
+    def __init__(self, name, args, thread):
+        self.name = name
+        self.args = args
+        self.thread = thread
+        self.start = time.time()
+        self.phases = dict((p, 0.0) for p in PHASES)
+        # Hedged requests add to a call from several threads.
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.stacks = {}
+
+
+@contextmanager
+def phase(name):
+    """
+    Count the time of the ``with`` block towards phase ``name`` of the call
+    being profiled in this thread, if any.
+    """
+    call = getattr(_local, 'call', None)
+    if call is None:
+        yield
+        return
+    # The phases being timed in this thread, innermost last, with the time
+    # spent in the phases nested in them.
+    stack = _local.stack
+    if stack and stack[-1][0] == 'login':
+        # Requests made to log in again count as time spent logging in.
+        if name == 'network':
+            with call.lock:
+                call.requests += 1
+        yield
+        return
+    start = time.time()
+    stack.append([name, 0.0])
+    try:
+        yield
+    finally:
+        _, nested = stack.pop()
+        elapsed = time.time() - start
+        if stack:
+            stack[-1][1] += elapsed
+        with call.lock:
+            call.phases[name] = call.phases.get(name, 0.0) + elapsed - nested
+            if name == 'network':
+                call.requests += 1
+
+
+def current_call():
+    """Return the call being profiled in this thread, or None."""
+    return getattr(_local, 'call', None)
+
+
+@contextmanager
+def use_call(call):
+    """
+    Count the phases and bytes of the ``with`` block towards ``call`` (as
+    returned by ``current_call``, possibly in another thread), if any.
+    """
+    previous = getattr(_local, 'call', None), getattr(_local, 'stack', None)
+    _local.call, _local.stack = call, []
+    try:
+        yield
+    finally:
+        _local.call, _local.stack = previous
+
+
+def record_bytes(count):
+    """Add ``count`` response bytes to the call being profiled, if any."""
+    call = getattr(_local, 'call', None)
+    if call is not None:
+        with call.lock:
+            call.bytes += count
+
+
+class CallProfiler(object):
+    def __init__(self, threshold=1.0, keep=50, sample_interval=None,
+                 cprofile=False):
+        """
+        :param threshold: *Optional* Seconds after which a call is reported.
+            Default is ``1``.
+        :param keep: *Optional* Number of reports kept. Default is ``50``.
+        :param sample_interval: *Optional* Seconds between samples of the
+            stack of a running call. Default is ``None`` (no sampling).
+        :param cprofile: *Optional* Run calls under ``cProfile``, and add
+            the top functions to the reports. Default is ``False``.
+        """
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.cprofile = cprofile
+        self.reports = deque(maxlen=keep)
+        self.calls = 0
+        self.slow_calls = 0
+        self._lock = threading.Lock()
+        self._active = {}
+        self._sampler = None
+
+    def instrument(self, client):
+        """Profile the public methods of ``client``."""
+        for name in dir(type(client)):
+            if name.startswith('_'):
+                continue
+            method = getattr(client, name)
+            # Generators are left alone; the calls they make are profiled.
+            if callable(method) and not inspect.isgeneratorfunction(method):
+                setattr(client, name, self._wrap(name, method))
+        return client
+
+    def _wrap(self, name, method):
+        profiler = self
+
+        def profiled(*args, **kwargs):
+            if getattr(_local, 'call', None) is not None:
+                return method(*args, **kwargs)
+            with profiler.profile(name, args, kwargs):
+                return method(*args, **kwargs)
+        profiled.__name__ = name
+        profiled.__doc__ = method.__doc__
+        return profiled
+
+    @contextmanager
+    def profile(self, name, args=(), kwargs=None):
+        """Profile the ``with`` block as a call of ``name``."""
+        call = _Call(name, _describe(args, kwargs), threading.current_thread())
+        _local.call, _local.stack = call, []
+        profile = None
+        if self.cprofile:
+            profile = cProfile.Profile()
+        if self.sample_interval:
+            self._start_sampling(call)
+        error = None
+        try:
+            if profile is not None:
+                profile.enable()
+            yield call
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if profile is not None:
+                profile.disable()
+            _local.call = None
+            with self._lock:
+                self._active.pop(call.thread.ident, None)
+            self._finish(call, profile, error)
+
+    def _finish(self, call, profile, error):
+        duration = time.time() - call.start
+        with self._lock:
+            self.calls += 1
+            if duration < self.threshold:
+                return
+            self.slow_calls += 1
+        phases = dict(call.phases)
+        phases['other'] = max(duration - sum(phases.values()), 0.0)
+        report = {
+            'call': call.name,
+            'args': call.args,
+            'start': call.start,
+            'duration': duration,
+            'phases': phases,
+            'requests': call.requests,
+            'bytes': call.bytes,
+            'error': repr(error) if error is not None else None,
+        }
+        if self.sample_interval:
+            with self._lock:
+                report['stacks'] = dict(call.stacks)
+        if profile is not None:
+            out = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats('cumulative').print_stats(20)
+            report['profile'] = out.getvalue()
+        with self._lock:
+            self.reports.append(report)
+
+    def _start_sampling(self, call):
+        with self._lock:
+            self._active[call.thread.ident] = call
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample)
+                self._sampler.daemon = True
+                self._sampler.start()
+
+    def _sample(self):
+        # One thread samples all profiled calls, until none is left.
+        while True:
+            time.sleep(self.sample_interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                for ident, call in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = ';'.join(
+                        '{0} ({1}:{2})'.format(f[2], f[0], f[1])
+                        for f in traceback.extract_stack(frame))
+                    call.stacks[stack] = call.stacks.get(stack, 0) + 1
+
+    def stats(self):
+        """Return the number of calls and of slow calls profiled."""
+        with self._lock:
+            return {'calls': self.calls, 'slow_calls': self.slow_calls,
+                    'reports': len(self.reports)}
+
+    def dump(self, path):
+        """Write the reports kept to ``path`` as JSON."""
+        with self._lock:
+            reports = list(self.reports)
+        with open(path, 'w') as f:
+            json.dump({'threshold': self.threshold, 'reports': reports}, f,
+                      indent=2, sort_keys=True)
+
+
+def _describe(args, kwargs):
+    parts = [repr(a)[:100] for a in args]
+    parts.extend('{0}={1}'.format(k, repr(v)[:100])
+                 for k, v in sorted((kwargs or {}).items()))
+    return ', '.join(parts)
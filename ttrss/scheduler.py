@@ -0,0 +1,196 @@
+"""
+Priority scheduling of API requests.
+
+A ``RequestScheduler`` sits in front of every request a client sends. It
+caps the number of requests in flight against one server, optionally limits
+the request rate with a token bucket, and lets waiting requests of a higher
+priority class go first, so bulk jobs sharing a client (or a server) with an
+interactive application can't starve it::
+
+    >>> from ttrss.scheduler import get_scheduler, priority, BULK
+    >>> scheduler = get_scheduler(url, max_concurrency=4, rate=10)
+    >>> client = TTRClient(url, user, password, scheduler=scheduler)
+    >>> with priority(BULK):
+    ...     sync_everything(client)
+"""
+from contextlib import contextmanager
+import heapq
+import itertools
+import threading
+import time
+
+
+INTERACTIVE = 0
+BULK = 1
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+_local = threading.local()
+
+
+def current_priority():
+    """Return the priority class of requests made by the current thread."""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    Run the requests made by the current thread inside the ``with`` block
+    with priority ``level`` (``INTERACTIVE`` or ``BULK``).
+    """
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class TokenBucket(object):
+    """
+    A token bucket allowing ``rate`` requests per second on average, with
+    bursts of up to ``burst`` requests.
+    """
+    def __init__(self, rate, burst=None, clock=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.burst
+        self._clock = clock
+        self._stamp = clock()
+
+    def take(self):
+        """
+        Take one token if available and return 0, otherwise return the
+        number of seconds until one will be.
+        """
+        now = self._clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _ClassStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_waiting,
+            'total_wait': self.total_wait,
+            'mean_wait': self.total_wait / self.requests if self.requests else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+
+class RequestScheduler(object):
+    """
+    Admits requests in priority order, at most ``max_concurrency`` at a time
+    and, if ``rate`` is given, no faster than ``rate`` per second.
+    """
+    def __init__(self, max_concurrency=4, rate=None, burst=None):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._stats = dict((p, _ClassStats()) for p in PRIORITY_NAMES)
+
+    @contextmanager
+    def slot(self, level=None):
+        """
+        Wait for a request slot and hold it for the ``with`` block. The
+        priority defaults to that of the current thread.
+        """
+        self.acquire(level)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, level=None, timeout=None):
+        """
+        Wait for a request slot, at most ``timeout`` seconds if given.
+
+        :return: Whether a slot was acquired.
+        """
+        if level is None:
+            level = current_priority()
+        stats = self._stats.setdefault(level, _ClassStats())
+        entry = (level, next(self._seq))
+        start = time.time()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            stats.waiting += 1
+            stats.max_waiting = max(stats.max_waiting, stats.waiting)
+            while True:
+                wait = None
+                if self._queue[0] == entry and \
+                        self._active < self.max_concurrency:
+                    wait = self.bucket.take() if self.bucket else 0
+                    if not wait:
+                        break
+                if timeout is not None:
+                    left = start + timeout - time.time()
+                    if left <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        stats.waiting -= 1
+                        self._cond.notify_all()
+                        return False
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+            heapq.heappop(self._queue)
+            self._active += 1
+            stats.waiting -= 1
+            waited = time.time() - start
+            stats.requests += 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            # The next entry in line may be able to go as well.
+            self._cond.notify_all()
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Return queue depth and wait time metrics, per priority class, and
+        the number of requests currently in flight.
+        """
+        with self._cond:
+            return {
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'classes': dict((PRIORITY_NAMES.get(p, p), s.as_dict())
+                                for p, s in self._stats.items()),
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(url, **kwargs):
+    """
+    Return the scheduler shared by all clients talking to the server at
+    ``url``, creating it with ``kwargs`` on first use.
+    """
+    with _schedulers_lock:
+        if url not in _schedulers:
+            _schedulers[url] = RequestScheduler(**kwargs)
+        return _schedulers[url]
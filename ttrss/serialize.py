@@ -0,0 +1,109 @@
+"""
+Compact serialization of model objects.
+
+Model objects can be pickled; the client they belong to is left out and can
+be attached again with ``attach()``. For shipping many objects between
+processes, ``dumps`` and ``loads`` use a more compact encoding: runs of
+objects of the same class with the same attributes share one list of
+attribute names, and each object is stored as a plain list of values. The
+result is encoded with ``msgpack`` if it is installed, and with ``marshal``
+otherwise (which is only readable by the same Python version)::
+
+    >>> data = dumps(client.get_headlines())
+    >>> headlines = loads(data, client=other_client)
+"""
+from datetime import datetime
+import marshal
+import time
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from ttrss.client import Category, Feed, Label, Headline, Article
+
+
+VERSION = 1
+
+CLASSES = dict((cls.__name__, cls)
+               for cls in (Category, Feed, Label, Headline, Article))
+
+
+def _encode(obj):
+    """Return the attribute names and values of ``obj``, and which are dates."""
+    keys = []
+    row = []
+    dates = []
+    for key, value in obj.__getstate__().items():
+        if isinstance(value, datetime):
+            value = time.mktime(value.timetuple())
+            dates.append(len(keys))
+        keys.append(key)
+        row.append(value)
+    return tuple(keys), row, dates
+
+
+def dumps(objects, format=None):
+    """
+    Serialize a sequence of model objects to bytes.
+
+    :param format: *Optional* ``'msgpack'`` or ``'marshal'``. Defaults to
+        ``'msgpack'`` if it is installed.
+    """
+    groups = []
+    current = None
+    for obj in objects:
+        name = type(obj).__name__
+        if name not in CLASSES:
+            raise TypeError('Can not serialize {0!r}'.format(obj))
+        keys, row, dates = _encode(obj)
+        if current is None or current[0] != name or current[1] != keys:
+            current = [name, keys, set(), []]
+            groups.append(current)
+        current[2].update(dates)
+        current[3].append(row)
+
+    data = [VERSION, [[name, list(keys), sorted(dates), rows]
+                      for name, keys, dates, rows in groups]]
+    if format is None:
+        format = 'msgpack' if msgpack is not None else 'marshal'
+    if format == 'msgpack':
+        return b'P' + msgpack.packb(data, use_bin_type=True)
+    if format == 'marshal':
+        return b'M' + marshal.dumps(data)
+    raise ValueError('Unknown format {0!r}'.format(format))
+
+
+def loads(data, client=None):
+    """
+    Return the list of model objects serialized in ``data``, attached to
+    ``client``.
+    """
+    tag, payload = data[:1], data[1:]
+    if tag == b'P':
+        if msgpack is None:
+            raise ValueError('msgpack is needed to read this data')
+        version, groups = msgpack.unpackb(payload, raw=False)
+    elif tag == b'M':
+        version, groups = marshal.loads(payload)
+    else:
+        raise ValueError('Not serialized model objects')
+    if version != VERSION:
+        raise ValueError('Unsupported version {0}'.format(version))
+
+    objects = []
+    append = objects.append
+    fromtimestamp = datetime.fromtimestamp
+    for name, keys, dates, rows in groups:
+        cls = CLASSES[name]
+        new = cls.__new__
+        for row in rows:
+            for i in dates:
+                if row[i] is not None:
+                    row[i] = fromtimestamp(row[i])
+            obj = new(cls)
+            state = dict(zip(keys, row))
+            state['_client'] = client
+            obj.__dict__ = state
+            append(obj)
+    return objects
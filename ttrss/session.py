@@ -0,0 +1,99 @@
+import json
+import os
+import time
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class FileSessionStore(object):
+    """
+    Keeps session ids in a JSON file so they can be reused across process
+    restarts instead of logging in again.
+
+    The file maps a user and server URL to the last known session id. Reads
+    and writes are serialized between processes with an advisory lock on a
+    ``.lock`` file next to it (where ``fcntl`` is available), and the file
+    itself is replaced atomically, so concurrent jobs sharing a store never
+    see a half written file.
+
+    Pass an instance as ``session_store`` to ``TTRClient``.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of the session file. Parent directories are created
+            as needed.
+        """
+        self.path = os.path.expanduser(path)
+
+    def load(self, url, user):
+        """Return the stored session id for ``user`` at ``url``, or ``None``."""
+        with self._locked(fcntl and fcntl.LOCK_SH):
+            entry = self._read().get(self._key(url, user))
+        return entry and entry['sid']
+
+    def save(self, url, user, sid):
+        """Store ``sid`` as the session id of ``user`` at ``url``."""
+        with self._locked(fcntl and fcntl.LOCK_EX):
+            sessions = self._read()
+            sessions[self._key(url, user)] = {
+                'url': url,
+                'user': user,
+                'sid': sid,
+                'saved': int(time.time()),
+            }
+            self._write(sessions)
+
+    def delete(self, url, user):
+        """Forget the session id of ``user`` at ``url``."""
+        with self._locked(fcntl and fcntl.LOCK_EX):
+            sessions = self._read()
+            if sessions.pop(self._key(url, user), None) is not None:
+                self._write(sessions)
+
+    def _key(self, url, user):
+        return u'{0} {1}'.format(user, url)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(sessions, f)
+        os.chmod(tmp, 0o600)
+        os.rename(tmp, self.path)
+
+    def _locked(self, mode):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        return _FileLock(self.path + '.lock', mode)
+
+
+class _FileLock(object):
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.f = open(self.path, 'a')
+            fcntl.flock(self.f.fileno(), self.mode)
+        return self
+
+    def __exit__(self, *exc):
+        if self.f is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
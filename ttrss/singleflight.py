@@ -0,0 +1,61 @@
+import threading
+
+from ttrss.exceptions import TTRDeadlineExceeded
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: while a call for a key is
+    in flight, other callers asking for the same key wait for it and get its
+    result (or exception) instead of making the call again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return ``fn()``, sharing the result with concurrent callers.
+
+        :param timeout: *Optional* Seconds to wait for a call already in
+            flight, after which ``TTRDeadlineExceeded`` is raised. Default is
+            ``None`` (no limit).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TTRDeadlineExceeded
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared}
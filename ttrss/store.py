@@ -0,0 +1,196 @@
+"""
+An append-only store for article contents.
+
+``ContentStore`` keeps article bodies zlib-compressed in segment files in a
+directory. Every write appends a record to the newest segment, and an
+in-memory index maps article ids to the segment and offset of their latest
+record. Reads go through a memory map of the segment, so only the record
+read is copied out of the page cache. Overwritten and deleted records stay
+in the segments until ``compact()`` rewrites them::
+
+    >>> store = ContentStore('~/.cache/ttrss-python/content')
+    >>> client = TTRClient(url, user, password, content_store=store)
+    >>> article = client.get_articles(1234)[0]
+    >>> article.content      # read back from the store
+
+A record is a header of the article id, the kind of record and the length
+of the compressed body, followed by the body. The index is rebuilt from the
+headers when the store is opened; a record cut short by a crash is dropped.
+"""
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+
+_HEADER = struct.Struct('>qBI')
+_PUT = 1
+_DELETE = 2
+_SEGMENT = re.compile(r'^(\d{8})\.seg$')
+
+
+class ContentStore(object):
+    def __init__(self, directory, segment_size=64 * 1024 * 1024,
+                 compression=6):
+        """
+        :param directory: Directory of the segment files. It is created if
+            needed.
+        :param segment_size: *Optional* Size in bytes after which a new
+            segment is started. Default is 64 MiB.
+        :param compression: *Optional* zlib compression level. Default is
+            ``6``.
+        """
+        self.directory = os.path.expanduser(directory)
+        self.segment_size = segment_size
+        self.compression = compression
+        self._lock = threading.RLock()
+        self._index = {}
+        self._maps = {}
+        self._live = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._segments = sorted(
+            int(m.group(1)) for m in
+            (_SEGMENT.match(name) for name in os.listdir(self.directory)) if m)
+        for segment in self._segments:
+            self._scan(segment)
+        if not self._segments:
+            self._segments.append(0)
+        self._file = open(self._path(self._segments[-1]), 'ab')
+
+    def _path(self, segment):
+        return os.path.join(self.directory, '{0:08d}.seg'.format(segment))
+
+    def _scan(self, segment):
+        path = self._path(segment)
+        size = os.path.getsize(path)
+        offset = 0
+        with open(path, 'rb') as f:
+            while offset + _HEADER.size <= size:
+                f.seek(offset)
+                article_id, kind, length = _HEADER.unpack(
+                    f.read(_HEADER.size))
+                end = offset + _HEADER.size + length
+                if end > size:
+                    break
+                self._forget(article_id)
+                if kind == _PUT:
+                    self._index[article_id] = (segment, offset, length)
+                    self._live += _HEADER.size + length
+                offset = end
+        if offset < size:
+            # An incomplete record at the end, from a crash while writing.
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _forget(self, article_id):
+        old = self._index.pop(article_id, None)
+        if old is not None:
+            self._live -= _HEADER.size + old[2]
+
+    def _append(self, article_id, kind, body):
+        if self._file.tell() >= self.segment_size:
+            self._file.close()
+            self._segments.append(self._segments[-1] + 1)
+            self._file = open(self._path(self._segments[-1]), 'ab')
+        offset = self._file.tell()
+        self._file.write(_HEADER.pack(article_id, kind, len(body)) + body)
+        self._file.flush()
+        return self._segments[-1], offset
+
+    def put(self, article_id, content):
+        """Store ``content`` (a string) for ``article_id``."""
+        body = zlib.compress(content.encode('utf-8'), self.compression)
+        with self._lock:
+            segment, offset = self._append(int(article_id), _PUT, body)
+            self._forget(int(article_id))
+            self._index[int(article_id)] = (segment, offset, len(body))
+            self._live += _HEADER.size + len(body)
+
+    def delete(self, article_id):
+        """Remove the content of ``article_id``, if stored."""
+        with self._lock:
+            if int(article_id) in self._index:
+                self._append(int(article_id), _DELETE, b'')
+                self._forget(int(article_id))
+
+    def get(self, article_id, default=None):
+        """Return the content of ``article_id``, or ``default``."""
+        with self._lock:
+            entry = self._index.get(int(article_id))
+            if entry is None:
+                return default
+            segment, offset, length = entry
+            start = offset + _HEADER.size
+            body = self._map(segment, start + length)[start:start + length]
+        return zlib.decompress(body).decode('utf-8')
+
+    def _map(self, segment, end):
+        m = self._maps.get(segment)
+        if m is None or len(m) < end:
+            # The segment grew since it was mapped.
+            if m is not None:
+                m.close()
+            if segment == self._segments[-1]:
+                self._file.flush()
+            with open(self._path(segment), 'rb') as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = m
+        return m
+
+    def __contains__(self, article_id):
+        return int(article_id) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def ids(self):
+        """Return the ids of all stored articles."""
+        with self._lock:
+            return list(self._index)
+
+    def stats(self):
+        """Return the number of articles, and live and total bytes."""
+        with self._lock:
+            total = sum(os.path.getsize(self._path(s))
+                        for s in self._segments)
+            return {'articles': len(self._index), 'segments':
+                    len(self._segments), 'live_bytes': self._live,
+                    'total_bytes': total}
+
+    def compact(self):
+        """
+        Rewrite the segments with only the latest record of every article.
+
+        :return: The number of bytes reclaimed.
+        """
+        with self._lock:
+            before = self.stats()['total_bytes']
+            old = self._segments
+            entries = sorted(self._index.items(), key=lambda e: e[1])
+            self._file.close()
+            self._segments = [old[-1] + 1]
+            self._file = open(self._path(self._segments[-1]), 'ab')
+            index = {}
+            for article_id, (segment, offset, length) in entries:
+                start = offset + _HEADER.size
+                body = self._map(segment, start + length)[start:start + length]
+                new_segment, new_offset = self._append(article_id, _PUT, body)
+                index[article_id] = (new_segment, new_offset, length)
+            os.fsync(self._file.fileno())
+            for segment in old:
+                m = self._maps.pop(segment, None)
+                if m is not None:
+                    m.close()
+                os.remove(self._path(segment))
+            self._index = index
+            return before - self.stats()['total_bytes']
+
+    def close(self):
+        with self._lock:
+            for m in self._maps.values():
+                m.close()
+            self._maps = {}
+            self._file.close()
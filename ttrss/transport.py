@@ -0,0 +1,165 @@
+"""
+Recording and replaying API traffic.
+
+``RecordingAdapter`` is a ``requests`` transport adapter that passes requests
+on to the network and keeps every request/response pair, including the
+logins made by ``TTRAuth``. ``ReplayAdapter`` serves a recording back
+without a server, either as fast as possible or with the latency observed
+while recording, so that parsing and object construction can be profiled
+offline and reproducibly::
+
+    >>> recorder = RecordingAdapter('session.json.gz')
+    >>> client = TTRClient(url, user, password, transport=recorder)
+    >>> run_workload(client)
+    >>> recorder.save()
+
+    >>> client = TTRClient(url, user, password,
+    ...                    transport=ReplayAdapter('session.json.gz'))
+    >>> run_workload(client)
+
+Requests are matched on their JSON body, ignoring the session id and
+password, which are never written to the recording. The session ids of login
+responses are recorded as ``SESSION_PLACEHOLDER``, which is what a replayed
+login returns.
+"""
+from collections import deque
+import datetime
+import gzip
+import json
+import threading
+import time
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+IGNORED_FIELDS = ('sid', 'password')
+
+SESSION_PLACEHOLDER = 'recorded-session'
+
+
+def request_key(body):
+    """Return the key a request body is recorded and matched under."""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        return body
+    for field in IGNORED_FIELDS:
+        data.pop(field, None)
+    return json.dumps(data, sort_keys=True)
+
+
+def _scrub(key, text):
+    # Replace the session id in the response to a login.
+    try:
+        if json.loads(key).get('op') != 'login':
+            return text
+        data = json.loads(text)
+    except (AttributeError, TypeError, ValueError):
+        return text
+    content = data.get('content') if isinstance(data, dict) else None
+    if not isinstance(content, dict) or 'session_id' not in content:
+        return text
+    content['session_id'] = SESSION_PLACEHOLDER
+    return json.dumps(data)
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Send requests through ``adapter`` (a new ``HTTPAdapter`` by default) and
+    record them. Call ``save()`` to write the recording to ``path``; it is
+    also saved when the session is closed.
+    """
+    def __init__(self, path, adapter=None):
+        super(RecordingAdapter, self).__init__()
+        self.path = path
+        self.adapter = adapter or HTTPAdapter()
+        self.exchanges = []
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        r = self.adapter.send(request, **kwargs)
+        key = request_key(request.body)
+        text = _scrub(key, r.text)
+        elapsed = time.time() - start
+        with self._lock:
+            self.exchanges.append((key, r.status_code, text, elapsed))
+        return r
+
+    def save(self):
+        """Write the recording, with each distinct response body stored once."""
+        with self._lock:
+            bodies = {}
+            responses = []
+            exchanges = []
+            for key, status, text, elapsed in self.exchanges:
+                if text not in bodies:
+                    bodies[text] = len(responses)
+                    responses.append(text)
+                exchanges.append([key, status, bodies[text],
+                                  round(elapsed, 6)])
+        data = json.dumps({'version': 1, 'responses': responses,
+                           'exchanges': exchanges})
+        with gzip.open(self.path, 'wb') as f:
+            f.write(data.encode('utf-8'))
+
+    def close(self):
+        self.save()
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answer requests from a recording made with ``RecordingAdapter``.
+
+    Identical requests are answered with their recorded responses in
+    order; once those run out, the last one is repeated. A request that was
+    never recorded raises ``LookupError``.
+
+    :param latency: ``'zero'`` (the default) to answer at once, or
+        ``'original'`` to wait as long as the server took while recording.
+    :param speed: *Optional* Divides the original latency. Default is ``1``.
+    """
+    def __init__(self, path, latency='zero', speed=1.0):
+        super(ReplayAdapter, self).__init__()
+        if latency not in ('zero', 'original'):
+            raise ValueError('latency must be "zero" or "original"')
+        self.latency = latency
+        self.speed = speed
+        self._lock = threading.Lock()
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        responses = data['responses']
+        self._exchanges = {}
+        for key, status, body, elapsed in data['exchanges']:
+            self._exchanges.setdefault(key, deque()).append(
+                (status, responses[body], elapsed))
+
+    def send(self, request, **kwargs):
+        key = request_key(request.body)
+        with self._lock:
+            queue = self._exchanges.get(key)
+            if not queue:
+                raise LookupError('No recorded response for {0}'.format(key))
+            exchange = queue.popleft() if len(queue) > 1 else queue[0]
+        status, text, elapsed = exchange
+        if self.latency == 'original':
+            time.sleep(elapsed / self.speed)
+
+        r = Response()
+        r.status_code = status
+        r._content = text.encode('utf-8')
+        r.encoding = 'utf-8'
+        r.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        r.url = request.url
+        r.request = request
+        r.elapsed = datetime.timedelta(seconds=elapsed)
+        r.connection = self
+        return r
+
+    def close(self):
+        pass
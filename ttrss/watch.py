@@ -0,0 +1,195 @@
+"""
+Watching feeds for new headlines.
+
+``HeadlineWatcher`` polls a set of feeds with ``getHeadlines(since_id=...)``
+and hands out only headlines it hasn't seen before. Every feed gets its own
+poll interval, adapted to how often new articles actually show up in it, so
+quiet feeds are asked less often and busy feeds more often. When several
+feeds of a category are due at the same time, the category is polled once
+instead of each feed.
+"""
+import threading
+import time
+
+
+class _FeedState(object):
+    def __init__(self, feed_id, cat_id, interval, now):
+        self.feed_id = feed_id
+        self.cat_id = cat_id
+        self.since_id = None
+        self.interval = interval
+        self.next_poll = now
+        self.last_poll = None
+        self.rate = None
+
+
+class HeadlineWatcher(object):
+    """
+    Watch feeds for new headlines.
+
+    New headlines can be consumed in three ways::
+
+        >>> watcher = HeadlineWatcher(client, client.get_feeds(cat_id=-3))
+        >>> watcher.run(callback)           # Call callback(headline)
+        >>> for headline in watcher: ...    # Blocking generator
+        >>> async for headline in watcher:  # Async iterator (Python 3.5+)
+
+    ``poll()`` polls the feeds that are due once and returns their new
+    headlines without waiting. ``stop()`` ends any of the loops above.
+    """
+    def __init__(self, client, feeds, min_interval=60, max_interval=3600,
+                 target_items=1.0, batch_categories=True, clock=time.time,
+                 **kwargs):
+        """
+        :param client: The ``TTRClient`` to poll with.
+        :param feeds: ``Feed`` objects or feed ids to watch. ``Feed`` objects
+            are preferred: their ``last_updated`` time seeds the initial poll
+            interval and their ``cat_id`` enables category polls.
+        :param min_interval: *Optional* Shortest poll interval in seconds.
+            Default is ``60``.
+        :param max_interval: *Optional* Longest poll interval in seconds.
+            Default is ``3600``.
+        :param target_items: *Optional* Number of new headlines the interval
+            of each feed is tuned to find per poll. Default is ``1.0``.
+        :param batch_categories: *Optional* Poll a whole category when more
+            than one of its feeds is due. Default is ``True``.
+        Any other keyword arguments are passed on to ``get_headlines``.
+        """
+        self._client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_items = target_items
+        self.batch_categories = batch_categories
+        self._clock = clock
+        self._kwargs = kwargs
+        self._stopped = threading.Event()
+        self.polls = 0
+
+        now = clock()
+        self._feeds = {}
+        for feed in feeds:
+            feed_id = int(getattr(feed, 'id', feed))
+            cat_id = getattr(feed, 'cat_id', None)
+            interval = min_interval
+            last_updated = getattr(feed, 'last_updated', None)
+            if hasattr(last_updated, 'timetuple'):
+                # A feed that hasn't changed for a long time is unlikely to
+                # change in the next minute.
+                age = now - time.mktime(last_updated.timetuple())
+                interval = self._clamp(age / 2)
+            self._feeds[feed_id] = _FeedState(
+                feed_id, None if cat_id is None else int(cat_id),
+                interval, now)
+
+    def watermarks(self):
+        """Return a dict of feed id -> highest headline id seen."""
+        return dict((s.feed_id, s.since_id) for s in self._feeds.values())
+
+    def intervals(self):
+        """Return a dict of feed id -> current poll interval in seconds."""
+        return dict((s.feed_id, s.interval) for s in self._feeds.values())
+
+    def next_poll(self):
+        """Return the time at which the next feed is due."""
+        return min(s.next_poll for s in self._feeds.values())
+
+    def poll(self):
+        """
+        Poll every feed that is due and return its new headlines, oldest
+        first. The first poll of a feed only sets its watermark.
+        """
+        now = self._clock()
+        by_cat = {}
+        new = []
+        for s in self._feeds.values():
+            if s.next_poll > now:
+                continue
+            if s.since_id is None:
+                self._prime(s, now)
+            else:
+                by_cat.setdefault(s.cat_id, []).append(s)
+
+        for cat_id, states in by_cat.items():
+            if self.batch_categories and cat_id is not None and \
+                    len(states) > 1:
+                # Cover every primed feed of the category, due or not.
+                states = [s for s in self._feeds.values()
+                          if s.cat_id == cat_id and s.since_id is not None]
+                new.extend(self._poll(cat_id, True, states, now))
+            else:
+                for s in states:
+                    new.extend(self._poll(s.feed_id, False, [s], now))
+        new.sort(key=lambda h: h.id)
+        return new
+
+    def _prime(self, s, now):
+        kwargs = dict(self._kwargs, feed_id=s.feed_id, limit=1)
+        headlines = self._client.get_headlines(**kwargs)
+        self.polls += 1
+        s.since_id = max([h.id for h in headlines] or [0])
+        s.last_poll = now
+        s.next_poll = now + s.interval
+
+    def _poll(self, feed_id, is_cat, states, now):
+        kwargs = dict(self._kwargs, feed_id=feed_id, is_cat=is_cat,
+                      since_id=min(s.since_id for s in states))
+        if is_cat:
+            kwargs['include_nested'] = False
+        headlines = list(self._client.iter_headlines(**kwargs))
+        self.polls += 1
+
+        watched = dict((s.feed_id, s) for s in states)
+        counts = dict.fromkeys(watched, 0)
+        new = []
+        for h in headlines:
+            s = watched.get(int(getattr(h, 'feed_id', feed_id)))
+            if s is None or h.id <= s.since_id:
+                continue
+            new.append(h)
+            counts[s.feed_id] += 1
+        for h in new:
+            s = watched[int(getattr(h, 'feed_id', feed_id))]
+            s.since_id = max(s.since_id, h.id)
+        for s in states:
+            self._adapt(s, counts[s.feed_id], now)
+        return new
+
+    def _adapt(self, s, count, now):
+        if s.last_poll is not None and now > s.last_poll:
+            rate = count / float(now - s.last_poll)
+            s.rate = rate if s.rate is None else 0.5 * rate + 0.5 * s.rate
+            if s.rate > 0:
+                s.interval = self._clamp(self.target_items / s.rate)
+            else:
+                s.interval = self._clamp(s.interval * 1.5)
+        s.last_poll = now
+        s.next_poll = now + s.interval
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def stop(self):
+        """Stop ``run()`` and the iterators."""
+        self._stopped.set()
+
+    def _wait(self):
+        delay = self.next_poll() - self._clock()
+        if delay > 0:
+            self._stopped.wait(delay)
+        return not self._stopped.is_set()
+
+    def run(self, callback):
+        """Call ``callback(headline)`` for every new headline until stopped."""
+        for h in self:
+            callback(h)
+
+    def __iter__(self):
+        while not self._stopped.is_set():
+            for h in self.poll():
+                yield h
+            if not self._wait():
+                return
+
+    def __aiter__(self):
+        from ttrss._aio import AsyncIterator
+        return AsyncIterator(iter(self))